@@ -1,10 +1,15 @@
 """
 Microsoft Graph API Client für verschiedene Microsoft-Dienste.
 """
-import requests
-from typing import Dict, List, Any, Optional
+import time
+import traceback
+from typing import Dict, List, Any, Iterator, Optional
 from urllib.parse import urlparse
+
+import requests
+
 from .auth import auth_manager
+from .utils import create_http_session, json_dumps, json_loads
 
 
 class MSGraphAPIError(Exception):
@@ -16,27 +21,35 @@ class MSGraphClient:
     """Client für Microsoft Graph API."""
 
     BASE_URL = "https://graph.microsoft.com/v1.0"
+    # Maximale Anzahl Requests pro JSON-$batch
+    BATCH_LIMIT = 20
 
-    def __init__(self, auth_manager_instance=None):
+    def __init__(self, auth_manager_instance=None, session: Optional[requests.Session] = None):
         self.auth = auth_manager_instance or auth_manager
+        # Persistente Session: Keep-Alive statt neuem TLS-Handshake pro Request
+        self.session = session or create_http_session()
 
     def _make_request(self, method: str, endpoint: str, **kwargs) -> Dict[str, Any]:
         """Generische HTTP-Anfrage an Microsoft Graph API."""
         url = f"{self.BASE_URL}{endpoint}"
+        headers = self.auth.microsoft.headers
+        if "json" in kwargs:
+            kwargs["data"] = json_dumps(kwargs.pop("json"))
+            headers = {**headers, "Content-Type": "application/json"}
 
         if method.lower() == "get":
-            response = requests.get(url, headers=self.auth.microsoft.headers, **kwargs)
+            response = self.session.get(url, headers=headers, **kwargs)
         elif method.lower() == "post":
-            response = requests.post(url, headers=self.auth.microsoft.headers, **kwargs)
+            response = self.session.post(url, headers=headers, **kwargs)
         elif method.lower() == "patch":
-            response = requests.patch(url, headers=self.auth.microsoft.headers, **kwargs)
+            response = self.session.patch(url, headers=headers, **kwargs)
         else:
             raise ValueError(f"Unsupported HTTP method: {method}")
 
         if not response.ok:
             raise MSGraphAPIError(f"Microsoft Graph API error: {response.status_code} - {response.text}")
 
-        return response.json()
+        return json_loads(response.content)
 
     def resolve_site_id_from_url(self, site_url: str) -> str:
         """Site-ID aus SharePoint-URL auflösen."""
@@ -121,13 +134,11 @@ class MSGraphClient:
                     except Exception as group_error:
                         # Fehler nur für diese Gruppe loggen, andere Gruppen weiter verarbeiten
                         print(f"[⚠] Section Group '{group_name}' konnte nicht geladen werden: {group_error}")
-                        import traceback
                         traceback.print_exc()
                     
             except Exception as e:
                 # Fehler beim Abrufen der Section Groups Liste
                 print(f"[⚠] Section Groups konnten nicht abgerufen werden: {e}")
-                import traceback
                 traceback.print_exc()
         
         return all_sections
@@ -209,7 +220,7 @@ class MSGraphClient:
     def get_page_content(self, site_id: str, page_id: str) -> bytes:
         """HTML-Inhalt einer OneNote-Seite abrufen."""
         url = f"{self.BASE_URL}/sites/{site_id}/onenote/pages/{page_id}/content"
-        response = requests.get(url, headers=self.auth.microsoft.headers)
+        response = self.session.get(url, headers=self.auth.microsoft.headers)
 
         if not response.ok:
             raise MSGraphAPIError(f"Page content fetch failed: {response.status_code} - {response.text}")
@@ -219,7 +230,7 @@ class MSGraphClient:
     def get_resource_content(self, site_id: str, resource_id: str) -> bytes:
         """Binärinhalt einer OneNote-Ressource abrufen."""
         url = f"{self.BASE_URL}/sites/{site_id}/onenote/resources/{resource_id}/content"
-        response = requests.get(url, headers=self.auth.microsoft.headers)
+        response = self.session.get(url, headers=self.auth.microsoft.headers)
 
         if not response.ok:
             raise MSGraphAPIError(f"Resource fetch failed: {response.status_code} - {response.text}")
@@ -274,14 +285,13 @@ class MSGraphClient:
 
         return buckets
 
-    def list_planner_tasks(self, plan_id: str) -> List[Dict[str, Any]]:
-        """Alle Tasks eines Planner-Plans abrufen."""
-        tasks = []
+    def iter_planner_tasks(self, plan_id: str) -> Iterator[Dict[str, Any]]:
+        """Tasks eines Planner-Plans seitenweise liefern, sobald die Seite geladen ist."""
         endpoint = f"/planner/plans/{plan_id}/tasks"
 
         while endpoint:
             result = self._make_request("GET", endpoint)
-            tasks.extend(result.get("value", []))
+            yield from result.get("value", [])
 
             # Nächste Seite laden falls vorhanden
             next_link = result.get("@odata.nextLink")
@@ -290,13 +300,114 @@ class MSGraphClient:
             else:
                 endpoint = None
 
-        return tasks
+    def list_planner_tasks(self, plan_id: str) -> List[Dict[str, Any]]:
+        """Alle Tasks eines Planner-Plans abrufen."""
+        return list(self.iter_planner_tasks(plan_id))
 
     def get_task_details(self, task_id: str) -> Dict[str, Any]:
         """Detaillierte Task-Informationen abrufen (inkl. Beschreibung, Checklisten)."""
         endpoint = f"/planner/tasks/{task_id}/details"
         return self._make_request("GET", endpoint)
 
+    def batch(self, requests_list: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """
+        Bis zu BATCH_LIMIT Teil-Requests mit einem JSON-$batch-Request senden.
+        
+        Args:
+            requests_list: Teil-Requests, z.B. {"id": "1", "method": "GET", "url": "/planner/plans/{id}"}
+        
+        Returns:
+            Dict Request-ID -> Teil-Response ({"status", "headers", "body"})
+        """
+        if len(requests_list) > self.BATCH_LIMIT:
+            raise ValueError(f"Max. {self.BATCH_LIMIT} Requests pro Batch")
+
+        result = self._make_request("POST", "/$batch", json={"requests": requests_list})
+        return {sub["id"]: sub for sub in result.get("responses", [])}
+
+    def _batch_body(self, sub: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Body einer $batch-Teil-Response; Fehlerstatus als MSGraphAPIError."""
+        if not sub or sub.get("status") != 200:
+            status = sub.get("status") if sub else "fehlt"
+            raise MSGraphAPIError(f"Microsoft Graph API error: {status} - {(sub or {}).get('body')}")
+        return sub.get("body", {})
+
+    def _collect_values(self, result: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """'value' einer Listen-Response samt aller Folgeseiten (@odata.nextLink)."""
+        values = list(result.get("value", []))
+        next_link = result.get("@odata.nextLink")
+        while next_link:
+            result = self._make_request("GET", next_link.replace(self.BASE_URL, ""))
+            values.extend(result.get("value", []))
+            next_link = result.get("@odata.nextLink")
+        return values
+
+    def get_planner_plan_bundle(self, plan_id: str) -> Dict[str, Any]:
+        """
+        Plan, Plan-Details, Buckets und Tasks mit einem $batch-Request abrufen.
+        
+        Returns:
+            Dict mit "plan", "details" (leer falls nicht abrufbar), "buckets", "tasks"
+        """
+        responses = self.batch([
+            {"id": "plan", "method": "GET", "url": f"/planner/plans/{plan_id}"},
+            {"id": "details", "method": "GET", "url": f"/planner/plans/{plan_id}/details"},
+            {"id": "buckets", "method": "GET", "url": f"/planner/plans/{plan_id}/buckets"},
+            {"id": "tasks", "method": "GET", "url": f"/planner/plans/{plan_id}/tasks"},
+        ])
+
+        try:
+            details = self._batch_body(responses.get("details"))
+        except MSGraphAPIError:
+            details = {}  # Category-Descriptions sind optional
+
+        return {
+            "plan": self._batch_body(responses.get("plan")),
+            "details": details,
+            "buckets": self._collect_values(self._batch_body(responses.get("buckets"))),
+            "tasks": self._collect_values(self._batch_body(responses.get("tasks"))),
+        }
+
+    def get_task_details_batch(self, task_ids: List[str], max_retries: int = 3) -> Dict[str, Dict[str, Any]]:
+        """
+        Task-Details für bis zu BATCH_LIMIT Tasks mit einem $batch-Request abrufen.
+        
+        Gedrosselte (429) oder fehlgeschlagene (5xx) Teil-Requests werden nach
+        Retry-After erneut gesendet; andere Fehler werden ausgelassen.
+        
+        Returns:
+            Dict Task-ID -> Details
+        """
+        if len(task_ids) > self.BATCH_LIMIT:
+            raise ValueError(f"Max. {self.BATCH_LIMIT} Tasks pro Batch")
+
+        details = {}
+        pending = list(task_ids)
+        for attempt in range(max_retries + 1):
+            responses = self.batch([
+                {"id": str(i), "method": "GET", "url": f"/planner/tasks/{task_id}/details"}
+                for i, task_id in enumerate(pending)
+            ])
+
+            retry = []
+            wait = 0
+            for sub in responses.values():
+                task_id = pending[int(sub["id"])]
+                status = sub.get("status", 0)
+                if status == 200:
+                    details[task_id] = sub.get("body", {})
+                elif status == 429 or status >= 500:
+                    retry.append(task_id)
+                    retry_after = (sub.get("headers") or {}).get("Retry-After")
+                    wait = max(wait, int(retry_after) if str(retry_after).isdigit() else 2 ** attempt)
+
+            pending = retry
+            if not pending or attempt == max_retries:
+                break
+            time.sleep(wait)
+
+        return details
+
     def get_group_members(self, group_id: str) -> List[Dict[str, Any]]:
         """Gruppenmitglieder abrufen (für Planner-Zuweisungen)."""
         members = []
@@ -1,10 +1,18 @@
 """
 Notion API Client mit gemeinsamen Operationen für alle Migrationstools.
 """
-import time
 import requests
 from typing import Dict, List, Any, Optional
 from .auth import auth_manager
+from .utils import RateLimiter, create_http_session, json_dumps, json_loads
+
+
+# Notion erlaubt im Mittel ~3 Requests/s - ein Limiter für alle Clients/Threads
+NOTION_RATE_LIMIT = 3.0
+rate_limiter = RateLimiter(NOTION_RATE_LIMIT)
+
+# Maximale Dateigröße der File Upload API (Single-Part)
+MAX_UPLOAD_BYTES = 20 * 1024 * 1024
 
 
 class NotionAPIError(Exception):
@@ -15,8 +23,10 @@ class NotionAPIError(Exception):
 class NotionClient:
     """Wrapper für Notion API Operationen."""
 
-    def __init__(self, auth_manager_instance=None):
+    def __init__(self, auth_manager_instance=None, session: Optional[requests.Session] = None):
         self.auth = auth_manager_instance or auth_manager
+        # Persistente Session: Keep-Alive statt neuem TLS-Handshake pro Request
+        self.session = session or create_http_session()
 
     def _normalize_uuid(self, uuid_str: str) -> str:
         """
@@ -51,20 +61,23 @@ class NotionClient:
     def _make_request(self, method: str, endpoint: str, **kwargs) -> Dict[str, Any]:
         """Generische HTTP-Anfrage an Notion API."""
         url = f"https://api.notion.com/v1{endpoint}"
+        if "json" in kwargs:
+            kwargs["data"] = json_dumps(kwargs.pop("json"))
+        rate_limiter.wait()
 
         if method.lower() == "get":
-            response = requests.get(url, headers=self.auth.notion.headers, **kwargs)
+            response = self.session.get(url, headers=self.auth.notion.headers, **kwargs)
         elif method.lower() == "post":
-            response = requests.post(url, headers=self.auth.notion.headers, **kwargs)
+            response = self.session.post(url, headers=self.auth.notion.headers, **kwargs)
         elif method.lower() == "patch":
-            response = requests.patch(url, headers=self.auth.notion.headers, **kwargs)
+            response = self.session.patch(url, headers=self.auth.notion.headers, **kwargs)
         else:
             raise ValueError(f"Unsupported HTTP method: {method}")
 
         if not response.ok:
             raise NotionAPIError(f"Notion API error: {response.status_code} - {response.text}")
 
-        return response.json()
+        return json_loads(response.content)
 
     def get_database(self, database_id: str) -> Dict[str, Any]:
         """Datenbank-Informationen abrufen."""
@@ -181,7 +194,6 @@ class NotionClient:
         for i in range(0, len(children), 50):
             batch = children[i:i+50]
             result = self._make_request("PATCH", url, json={"children": batch})
-            time.sleep(0.12)  # Rate limiting
 
         return result or {}
 
@@ -242,14 +254,15 @@ class NotionClient:
         Schritt 2: Datei senden (WICHTIG: OHNE Content-Type Header!)
         """
         # Validierung
-        if len(data) > 20 * 1024 * 1024:
+        if len(data) > MAX_UPLOAD_BYTES:
             print(f"[⚠] Datei zu groß (>20MB): {filename}")
             return None
         
         ct = content_type or "application/octet-stream"
         
         # Schritt 1: file_upload erstellen
-        response = requests.post(
+        rate_limiter.wait()
+        response = self.session.post(
             "https://api.notion.com/v1/file_uploads",
             headers=self.auth.notion.headers,
             json={"filename": filename, "content_type": ct}
@@ -259,13 +272,14 @@ class NotionClient:
             print(f"[⚠] file_upload creation failed: {response.text[:300]}")
             return None
 
-        file_upload_id = response.json().get("id")
+        file_upload_id = json_loads(response.content).get("id")
         
         # Schritt 2: Datei senden
         # KRITISCH: Nicht Content-Type manuell setzen! 
-        # requests.post() mit files= setzt automatisch multipart/form-data mit boundary
+        # session.post() mit files= setzt automatisch multipart/form-data mit boundary
         files = {"file": (filename, data, ct)}
-        upload_response = requests.post(
+        rate_limiter.wait()
+        upload_response = self.session.post(
             f"https://api.notion.com/v1/file_uploads/{file_upload_id}/send",
             headers=self.auth.notion.headers_no_content_type,  # NUR Authorization + Notion-Version
             files=files
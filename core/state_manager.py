@@ -90,8 +90,8 @@ def generate_page_key(site_id: str, notebook_id: str, section_id: str, page_id:
 
 
 def calculate_checksum(content: bytes) -> str:
-    """MD5-Checksumme für Content berechnen."""
-    return hashlib.md5(content).hexdigest()
+    """Checksumme für Content berechnen (BLAKE2b, 128 Bit - schneller als MD5)."""
+    return hashlib.blake2b(content, digest_size=16).hexdigest()
 
 
 # Convenience-Funktionen
@@ -3,13 +3,22 @@ Gemeinsame Utilities für alle Migrationstools.
 """
 import os
 import csv
+import json
 import re
+import time
+import threading
 import mimetypes
+from collections import OrderedDict
+from functools import lru_cache
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 from urllib.parse import urlparse
 
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
 
 # Content-Type Detection
 ALLOWED_EXTENSIONS = {
@@ -44,7 +53,7 @@ def sniff_content_type(data: bytes) -> Optional[str]:
             return "image/png"
         elif b.startswith(b"\xff\xd8\xff"):
             return "image/jpeg"
-        elif b.startswith(b"GIF87a") or b.startswith(b"GIF89a"):
+        elif b.startswith((b"GIF87a", b"GIF89a")):
             return "image/gif"
         elif b.startswith(b"%PDF-"):
             return "application/pdf"
@@ -72,6 +81,12 @@ def get_extension_from_filename(filename: str) -> str:
     return ext.lower()
 
 
+@lru_cache(maxsize=256)
+def _guess_extension(content_type: str) -> Optional[str]:
+    """mimetypes.guess_extension mit Cache (pro Content-Type nur einmal)."""
+    return mimetypes.guess_extension(content_type)
+
+
 def get_safe_filename(original_name: str, content_type: str) -> str:
     """Sicheren Dateinamen für Notion-Upload generieren."""
     name, _ = os.path.splitext(original_name)
@@ -81,7 +96,7 @@ def get_safe_filename(original_name: str, content_type: str) -> str:
 
     # Fallback: mimetypes oder .bin
     if not ext:
-        ext = mimetypes.guess_extension(content_type) or ".bin"
+        ext = _guess_extension(content_type) or ".bin"
 
     # Sicherheitscheck: nur erlaubte Extensions
     if ext not in ALLOWED_EXTENSIONS:
@@ -101,9 +116,18 @@ def get_safe_filename(original_name: str, content_type: str) -> str:
     return f"{name}{ext}"
 
 
+# Für die Magic-Byte-Erkennung reicht der Dateianfang
+SNIFF_BYTES = 4096
+
+
 def detect_content_type_and_filename(data: bytes, content_type_header: Optional[str],
                                    url: str) -> Tuple[str, str]:
-    """Content-Type und sicheren Dateinamen bestimmen."""
+    """
+    Content-Type und sicheren Dateinamen bestimmen.
+    
+    data muss nur den Dateianfang enthalten (z.B. raw[:SNIFF_BYTES]);
+    sniff_content_type prüft höchstens die ersten 2000 Bytes.
+    """
     # Header-Content-Type (falls vorhanden)
     header_ct = (content_type_header or "").split(";")[0].strip() or None
 
@@ -226,3 +250,95 @@ def create_clean_csv_path(original_path: Path) -> Path:
 def setup_rate_limiting(rate_per_second: float) -> float:
     """Rate Limiting konfigurieren."""
     return 1.0 / rate_per_second if rate_per_second > 0 else 0
+
+
+class RateLimiter:
+    """
+    Thread-sicherer Rate-Limiter (Mindestabstand zwischen Requests).
+    
+    Wartet nur, wenn der nächste freie Slot noch nicht erreicht ist -
+    statt nach jedem Request pauschal zu schlafen.
+    """
+
+    def __init__(self, rate_per_second: float):
+        self.min_interval = setup_rate_limiting(rate_per_second)
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        """Blockieren bis der nächste Request erlaubt ist."""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class LRUCache(OrderedDict):
+    """
+    Thread-sicherer, größenbegrenzter Cache mit Dict-Interface.
+    
+    Lesezugriffe markieren einen Eintrag als zuletzt benutzt; beim Überschreiten
+    von maxsize wird der am längsten unbenutzte Eintrag verworfen.
+    """
+
+    def __init__(self, maxsize: int = 10_000, *args, **kwargs):
+        self.maxsize = maxsize
+        self._lock = threading.RLock()
+        super().__init__(*args, **kwargs)
+
+    def __getitem__(self, key):
+        with self._lock:
+            value = super().__getitem__(key)
+            self.move_to_end(key)
+            return value
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self:
+                return default
+            return self[key]
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            super().__setitem__(key, value)
+            self.move_to_end(key)
+            while len(self) > self.maxsize:
+                self.popitem(last=False)
+
+
+# orjson (Rust) ist beim (De-)Serialisieren mehrfach schneller - optional, Fallback: json
+try:
+    import orjson
+
+    def json_dumps(obj) -> bytes:
+        """Objekt als UTF-8-JSON-Bytes serialisieren."""
+        return orjson.dumps(obj)
+
+    json_loads = orjson.loads
+except ImportError:
+    def json_dumps(obj) -> bytes:
+        """Objekt als UTF-8-JSON-Bytes serialisieren."""
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    json_loads = json.loads
+
+
+# HTTP-Status, bei denen idempotente Requests automatisch wiederholt werden
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+def create_http_session(pool_connections: int = 8, pool_maxsize: int = 32,
+                        retries: int = 3) -> requests.Session:
+    """HTTP-Session mit Keep-Alive-Connection-Pool und Retry erstellen."""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        max_retries=Retry(total=retries, backoff_factor=0.3,
+                          status_forcelist=RETRY_STATUS, raise_on_status=False)
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
@@ -11,9 +11,10 @@ Dieses Modul orchestriert die OneNote-Migration:
 """
 import argparse
 import sys
+import traceback
 import warnings
 from pathlib import Path
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 
 # Unterdrücke urllib3 NotOpenSSLWarning (LibreSSL vs OpenSSL)
 warnings.filterwarnings("ignore", category=Warning, module="urllib3")
@@ -26,6 +27,7 @@ from core.state_manager import StateManager, generate_page_key, calculate_checks
 
 # Tool-Module importieren
 from .content_mapper import ContentMapper
+from .html_parser import UPLOAD_WORKERS
 from .resource_handler import ResourceHandler
 
 
@@ -81,6 +83,10 @@ Beispiele:
                           help="Überspringe unveränderte Seiten")
         parser.add_argument("--state-path", help="Pfad für State-Datei")
 
+        # Performance
+        parser.add_argument("--workers", type=int, default=UPLOAD_WORKERS,
+                          help=f"Parallele Asset-Downloads/-Uploads pro Seite (Standard: {UPLOAD_WORKERS})")
+
         # Debug-Optionen
         parser.add_argument("--verbose", "-v", action="store_true",
                           help="Detaillierte Ausgaben")
@@ -151,8 +157,13 @@ Beispiele:
         notebooks = self._find_notebooks(site_id)
 
         # 3. Sections verarbeiten
-        for notebook in notebooks:
-            self._process_notebook(site_id, notebook)
+        try:
+            for notebook in notebooks:
+                self._process_notebook(site_id, notebook)
+        finally:
+            # Prefetch-Pool beenden (auch bei Abbruch)
+            if self.content_mapper:
+                self.content_mapper.close()
         
         # 4. Automatisch Link-Resolution nach Import (wenn database_id angegeben)
         if self.args.database_id and not self.args.dry_run:
@@ -242,7 +253,10 @@ Beispiele:
 
         # ContentMapper mit site_id initialisieren (falls noch nicht gemacht)
         if not self.content_mapper:
-            self.content_mapper = ContentMapper(self.notion, self.ms_graph, site_id)
+            self.content_mapper = ContentMapper(
+                self.notion, self.ms_graph, site_id,
+                max_workers=max(1, self.args.workers)
+            )
 
         # Notebook-Name speichern für späteren Zugriff
         self._current_notebook_name = notebook_name
@@ -283,7 +297,6 @@ Beispiele:
         except Exception as e:
             print(f"[❌] Section-Laden fehlgeschlagen: {e}")
             if self.args and self.args.verbose:
-                import traceback
                 traceback.print_exc()
             return []
 
@@ -305,9 +318,29 @@ Beispiele:
         # Seiten laden
         pages = self._get_pages(site_id, section_id)
 
-        # Seiten verarbeiten
-        for page in pages:
-            self._process_page(site_id, notebook_id, section_id, page)
+        # Seiten verarbeiten - Content der nächsten Seite wird parallel vorab geladen,
+        # aber erst wenn feststeht, dass sie nicht per --resume übersprungen wird
+        prefetch = bool(self.content_mapper and self.args.database_id and not self.args.dry_run)
+        skip_decisions: Dict[str, Tuple[bool, Optional[str]]] = {}
+        for i, page in enumerate(pages):
+            if prefetch and i + 1 < len(pages):
+                next_page = pages[i + 1]
+                decision = self._skip_decision(next_page)
+                skip_decisions[next_page["id"]] = decision
+                if not decision[0]:
+                    self.content_mapper.prefetch_page_content(next_page["id"])
+            self._process_page(site_id, notebook_id, section_id, page,
+                               skip_decisions.pop(page["id"], None))
+
+        # Übrig gebliebene Vorab-Downloads nicht in die nächste Section mitnehmen
+        if self.content_mapper:
+            self.content_mapper.cancel_prefetch()
+
+    def _skip_decision(self, page: Dict[str, Any]) -> Tuple[bool, Optional[str]]:
+        """Bei --resume prüfen, ob die Seite unverändert ist und übersprungen wird."""
+        if self.args and self.args.resume and self.content_mapper and self.args.database_id:
+            return self.content_mapper.should_skip_page(page, self.args.database_id)
+        return False, None
 
     def _get_pages(self, site_id: str, section_id: str) -> List[Dict[str, Any]]:
         """Seiten einer Section laden."""
@@ -320,8 +353,14 @@ Beispiele:
             print(f"[❌] Seiten-Laden fehlgeschlagen: {e}")
             return []
 
-    def _process_page(self, site_id: str, notebook_id: str, section_id: str, page: Dict[str, Any]) -> None:
-        """Einzelne Seite verarbeiten."""
+    def _process_page(self, site_id: str, notebook_id: str, section_id: str, page: Dict[str, Any],
+                      skip_decision: Optional[Tuple[bool, Optional[str]]] = None) -> None:
+        """
+        Einzelne Seite verarbeiten.
+        
+        Args:
+            skip_decision: Bereits ermitteltes Ergebnis von _skip_decision (sonst wird geprüft)
+        """
         page_id = page["id"]
         page_title = page.get("title") or "Untitled"
 
@@ -332,11 +371,10 @@ Beispiele:
             return
 
         # Bei Resume: Seite überspringen falls unverändert
-        if self.args and self.args.resume and self.content_mapper:
-            should_skip, reason = self.content_mapper.should_skip_page(page, self.args.database_id)
-            if should_skip:
-                print(f"    ⏭️ Seite: {page_title} ({reason})")
-                return
+        should_skip, reason = skip_decision if skip_decision is not None else self._skip_decision(page)
+        if should_skip:
+            print(f"    ⏭️ Seite: {page_title} ({reason})")
+            return
 
         print(f"    📃 Seite: {page_title}")
 
@@ -406,7 +444,6 @@ Beispiele:
         except Exception as e:
             print(f"[❌] Fehler beim Laden der Seiten: {e}")
             if self.args.verbose:
-                import traceback
                 traceback.print_exc()
             sys.exit(1)
         
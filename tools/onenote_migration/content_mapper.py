@@ -8,15 +8,24 @@ Dieses Modul koordiniert:
 - Ressourcen-Verarbeitung
 - Notion-Page-Erstellung
 """
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import List, Dict, Any, Optional, Tuple
 
-from .html_parser import html_to_blocks_and_tables, append_table
+from core.utils import LRUCache
+from .html_parser import html_to_blocks_and_tables, append_table, UPLOAD_WORKERS
+
+# Maximale Anzahl gemerkter Upload-IDs (ältere Einträge werden verworfen)
+RESOURCE_CACHE_SIZE = 10_000
+
+# Vorgehaltene Vorab-Downloads: aktuelle Seite (noch nicht abgeholt) + nächste Seite
+PREFETCH_PAGES = 2
 
 
 class ContentMapper:
     """Orchestriert die Konvertierung von OneNote-Content zu Notion."""
 
-    def __init__(self, notion_client, ms_graph_client, site_id: str):
+    def __init__(self, notion_client, ms_graph_client, site_id: str,
+                 max_workers: int = UPLOAD_WORKERS):
         """
         Initialisierung.
         
@@ -24,10 +33,43 @@ class ContentMapper:
             notion_client: NotionClient-Instanz
             ms_graph_client: MSGraphClient-Instanz
             site_id: SharePoint-Site-ID
+            max_workers: Parallele Asset-Downloads/-Uploads pro Seite
         """
         self.notion = notion_client
         self.ms_graph = ms_graph_client
         self.site_id = site_id
+        self.max_workers = max_workers
+        # Resource-ID -> file_upload_id: gleiche Ressource nur einmal pro Migration hochladen
+        self.resource_cache: Dict[str, str] = LRUCache(RESOURCE_CACHE_SIZE)
+        # Vorab geladener HTML-Content der nächsten Seite (Page-ID -> Future)
+        self._prefetch_pool = ThreadPoolExecutor(max_workers=1)
+        self._prefetched: Dict[str, Future] = {}
+
+    def prefetch_page_content(self, page_id: str) -> None:
+        """
+        HTML-Content einer Seite im Hintergrund laden.
+        
+        Wird für die nächste Seite aufgerufen, bevor die aktuelle importiert wird -
+        deren noch nicht abgeholter Download bleibt daher erhalten. Es werden höchstens
+        PREFETCH_PAGES Seiten vorgehalten; ältere werden abgebrochen.
+        """
+        if page_id in self._prefetched:
+            return
+        while len(self._prefetched) >= PREFETCH_PAGES:
+            oldest = next(iter(self._prefetched))
+            self._prefetched.pop(oldest).cancel()
+        self._prefetched[page_id] = self._prefetch_pool.submit(self._fetch_page_content, page_id)
+
+    def cancel_prefetch(self) -> None:
+        """Nicht abgeholte Vorab-Downloads verwerfen (noch wartende werden abgebrochen)."""
+        for future in self._prefetched.values():
+            future.cancel()
+        self._prefetched.clear()
+
+    def close(self) -> None:
+        """Vorab-Downloads abbrechen und den Prefetch-Pool beenden."""
+        self.cancel_prefetch()
+        self._prefetch_pool.shutdown(wait=True)
 
     def should_skip_page(
         self,
@@ -117,8 +159,9 @@ class ContentMapper:
             created_time = onenote_page.get("createdDateTime")
             modified_time = onenote_page.get("lastModifiedDateTime")
 
-            # 2. HTML-Content laden
-            html_content = self._fetch_page_content(page_id)
+            # 2. HTML-Content laden (ggf. bereits vorab geladen)
+            prefetched = self._prefetched.pop(page_id, None)
+            html_content = prefetched.result() if prefetched else self._fetch_page_content(page_id)
             if not html_content:
                 print(f"[⚠] Kein Content für Seite: {page_title}")
                 return None
@@ -128,7 +171,9 @@ class ContentMapper:
                 html_content,
                 self.site_id,
                 self.ms_graph,
-                self.notion
+                self.notion,
+                resource_cache=self.resource_cache,
+                max_workers=self.max_workers
             )
 
             # 4. Web-URL extrahieren
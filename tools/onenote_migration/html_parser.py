@@ -6,16 +6,31 @@ OneNote HTML Parser - basiert auf v0.8.4 (bewährt)
 Parst OneNote HTML und erstellt Notion-Blöcke.
 Bilder werden INLINE verarbeitet während des Parsens.
 """
+import hashlib
 import re
-import time
-import requests
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import List, Dict, Any, Tuple, Optional
 from bs4 import BeautifulSoup, NavigableString, Tag
 
+from core.notion_client import MAX_UPLOAD_BYTES
+from core.utils import detect_content_type_and_filename, SNIFF_BYTES
+
+# Bewusst "html.parser" statt lxml: lxml baut <p> mit Block-Kindern
+# (<div>, <table>) um und reißt den Text danach ab - der Block-Walk
+# verlässt sich auf die Struktur, wie OneNote sie liefert.
+HTML_PARSER = "html.parser"
+
 
 # Marker für unvollständige Links (für Pass 2)
 INCOMPLETE_LINK_MARKER = " (Verlinkung unvollständig)"
 
+# Notion-Limit: Max. Blöcke pro Seite, die beim Import übernommen werden.
+# Ab Erreichen sammelt der Parser nur noch Tabellen (keine Downloads für verworfene Blöcke).
+MAX_BLOCKS = 150
+
+# Parallele Download+Upload-Jobs pro Seite (Notion erlaubt ~3 Requests/s)
+UPLOAD_WORKERS = 3
+
 
 def is_onenote_internal_link(href: str) -> bool:
     """Prüft ob ein Link ein OneNote-interner Link ist."""
@@ -63,6 +78,42 @@ def process_onenote_link(href: str) -> Tuple[str, str]:
     return href, ""
 
 
+_RE_RESOURCE_ID = re.compile(r"/onenote/resources/([^/$?]+)")
+
+
+def resource_cache_key(url: str) -> str:
+    """
+    Cache-Schlüssel für eine OneNote-Ressource.
+    
+    Dieselbe Ressource taucht mit unterschiedlichen URL-Präfixen auf
+    (siteCollections/sites/relativ) - daher über die Resource-ID cachen.
+    """
+    m = _RE_RESOURCE_ID.search(url)
+    return m.group(1) if m else url
+
+
+def make_block(block_type: str, body: Dict[str, Any]) -> Dict[str, Any]:
+    """Notion-Block {"object": "block", "type": t, t: body} erstellen."""
+    return {"object": "block", "type": block_type, block_type: body}
+
+
+def leading_text(node: Tag, limit: int = 64) -> str:
+    """
+    Textanfang eines Elements (für Präfix-Checks wie To-Do-Erkennung).
+    
+    Entspricht get_text(" ", strip=True), bricht aber nach ~limit Zeichen ab,
+    statt den gesamten Teilbaum zu einem String zusammenzusetzen.
+    """
+    out: List[str] = []
+    n = 0
+    for s in node.stripped_strings:
+        out.append(s)
+        n += len(s)
+        if n >= limit:
+            break
+    return " ".join(out)
+
+
 def process_list_recursive(
     list_el: Tag,
     depth: int = 0,
@@ -109,19 +160,22 @@ def process_list_recursive(
             checked = cb.has_attr("checked")
         
         # data-tag="to-do"
-        if not is_todo and (li.get("data-tag") and "to-do" in li.get("data-tag", "").lower()):
-            is_todo = True
+        if not is_todo:
+            dt = li.get("data-tag")
+            is_todo = bool(dt) and "to-do" in dt.lower()
         
         # Checkbox als Bild
         if not is_todo:
             img = li.find("img")
-            if img and any(x in (img.get("alt", "").lower()) for x in ["to do", "todo", "checked", "unchecked"]):
-                is_todo = True
-                checked = "check" in img.get("alt", "").lower()
+            if img:
+                alt_l = (img.get("alt") or "").lower()
+                if any(x in alt_l for x in ("to do", "todo", "checked", "unchecked")):
+                    is_todo = True
+                    checked = "check" in alt_l
         
         # Unicode-Checkboxen
         if not is_todo:
-            text = li.get_text(" ", strip=True)
+            text = leading_text(li)
             if text.startswith(checkbox_unicode_true):
                 is_todo = True
                 checked = True
@@ -137,22 +191,14 @@ def process_list_recursive(
         
         # Block erstellen
         if is_todo:
-            item = {
-                "object": "block",
-                "type": "to_do",
-                "to_do": {
-                    "rich_text": build_rich_text(li, exclude_nested_lists=True),
-                    "checked": checked
-                }
-            }
+            item = make_block("to_do", {
+                "rich_text": build_rich_text(li, exclude_nested_lists=True),
+                "checked": checked
+            })
         else:
-            item = {
-                "object": "block",
-                "type": block_type,
-                block_type: {
-                    "rich_text": build_rich_text(li, exclude_nested_lists=True)
-                }
-            }
+            item = make_block(block_type, {
+                "rich_text": build_rich_text(li, exclude_nested_lists=True)
+            })
         
         # Verschachtelte Liste finden und verarbeiten (wenn noch nicht max depth)
         if depth < max_depth - 1:  # -1 weil depth bei 0 startet
@@ -179,155 +225,145 @@ def process_list_recursive(
     return items
 
 
+_ANNOTATION_KEYS = ("bold", "italic", "strikethrough", "underline", "code")
+_NO_ANNOTATIONS = dict.fromkeys(_ANNOTATION_KEYS, False)
+
+# HTML-Tag -> Annotation
+_TAG_ANNOTATIONS = {
+    "strong": "bold", "b": "bold",
+    "em": "italic", "i": "italic",
+    "u": "underline",
+    "strike": "strikethrough", "s": "strikethrough", "del": "strikethrough",
+    "code": "code",
+}
+
+# Tags, die nie über den Plain-Text-Fast-Path laufen dürfen
+_COMPLEX_TAGS = frozenset(_TAG_ANNOTATIONS) | {"a", "ul", "ol"}
+
+
+def _parse_style_annotations(style_str: str, annotations: Dict[str, bool]) -> None:
+    """CSS-Style parsen und Formatierungs-Annotations setzen (OR-Logik, in-place)."""
+    style_lower = style_str.lower()
+    
+    # Bold: font-weight:bold oder font-weight:700+
+    if "font-weight:bold" in style_lower or any(f"font-weight:{w}" in style_lower for w in ("700", "800", "900")):
+        annotations["bold"] = True
+    
+    # Italic: font-style:italic
+    if "font-style:italic" in style_lower:
+        annotations["italic"] = True
+    
+    # Underline: text-decoration:underline
+    if "text-decoration:underline" in style_lower:
+        annotations["underline"] = True
+    
+    # Strikethrough: text-decoration:line-through
+    if "text-decoration:line-through" in style_lower:
+        annotations["strikethrough"] = True
+
+
+def _text_part(content: str, annotations: Dict[str, bool], link: Optional[str] = None) -> Dict[str, Any]:
+    """rich_text-Element erstellen (Notion-Limit 2000 Zeichen, Annotations nur wenn gesetzt)."""
+    text: Dict[str, Any] = {"content": content[:2000]}
+    if link:
+        text["link"] = {"url": link}
+    part: Dict[str, Any] = {"type": "text", "text": text}
+    if any(annotations.values()):
+        part["annotations"] = dict(annotations)
+    return part
+
+
 def build_rich_text(node: Tag, exclude_nested_lists: bool = False) -> List[Dict[str, Any]]:
     """
     Rich-Text aus HTML-Element erstellen mit Formatierungs-Support.
     
     Unterstützt: bold, italic, underline, strikethrough, code
     Erkennt sowohl HTML-Tags als auch CSS-Styles!
+    
+    Iterativer Durchlauf mit explizitem Stack (OneNote verschachtelt <span>s tief).
     """
+    # Fast-Path: unformatiertes Element mit nur einem Text-Kind (häufigster <p>-Fall)
+    contents = node.contents
+    if (len(contents) <= 1 and not node.get("style")
+            and node.name.lower() not in _COMPLEX_TAGS):
+        if not contents:
+            return [{"type": "text", "text": {"content": ""}}]
+        if isinstance(contents[0], NavigableString):
+            text = str(contents[0])
+            if text.strip():
+                return [{"type": "text", "text": {"content": text[:2000]}}]
+            return [{"type": "text", "text": {"content": ""}}]
+    
     parts: List[Dict[str, Any]] = []
     
-    def parse_style_annotations(style_str: str) -> Dict[str, bool]:
-        """Parse CSS style string und extrahiere Formatierungs-Annotations."""
-        annotations = {
-            "bold": False,
-            "italic": False,
-            "strikethrough": False,
-            "underline": False,
-            "code": False
-        }
+    # Stack aus (Knoten, geerbte Annotations); Kinder werden umgekehrt gepusht,
+    # damit sie in Dokumentreihenfolge abgearbeitet werden.
+    stack: List[Tuple[Any, Dict[str, bool]]] = [(node, _NO_ANNOTATIONS)]
+    while stack:
+        n, annotations = stack.pop()
         
-        if not style_str:
-            return annotations
-        
-        style_lower = style_str.lower()
-        
-        # Bold: font-weight:bold oder font-weight:700+
-        if "font-weight:bold" in style_lower or any(f"font-weight:{w}" in style_lower for w in ["700", "800", "900"]):
-            annotations["bold"] = True
-        
-        # Italic: font-style:italic
-        if "font-style:italic" in style_lower:
-            annotations["italic"] = True
+        if isinstance(n, NavigableString):
+            # Text mit aktuellen Formatierungen (Whitespace-only führt zu Problemen)
+            text = str(n)
+            if text.strip():
+                parts.append(_text_part(text, annotations))
+            continue
         
-        # Underline: text-decoration:underline
-        if "text-decoration:underline" in style_lower:
-            annotations["underline"] = True
+        if not isinstance(n, Tag):
+            continue
         
-        # Strikethrough: text-decoration:line-through
-        if "text-decoration:line-through" in style_lower:
-            annotations["strikethrough"] = True
+        tag_name = n.name.lower()
         
-        return annotations
-    
-    def process_node(n, annotations=None):
-        """Rekursiv durch DOM mit Annotations-Stack."""
-        if annotations is None:
-            annotations = {
-                "bold": False,
-                "italic": False,
-                "strikethrough": False,
-                "underline": False,
-                "code": False
-            }
+        # Verschachtelte Listen überspringen wenn gewünscht (für Nested List Support)
+        if exclude_nested_lists and tag_name in ("ul", "ol"):
+            continue
         
-        if isinstance(n, NavigableString):
-            # Text mit aktuellen Formatierungen
-            text = str(n)
-            if text:
-                parts.append({
-                    "type": "text",
-                    "text": {"content": text},
-                    "annotations": annotations.copy()
-                })
-        elif isinstance(n, Tag):
-            tag_name = n.name.lower()
-            
-            # Verschachtelte Listen überspringen wenn gewünscht (für Nested List Support)
-            if exclude_nested_lists and tag_name in ("ul", "ol"):
-                return
-            
-            # Neue Annotations basierend auf Tag UND Style
-            new_annotations = annotations.copy()
-            
+        # Neue Annotations basierend auf Tag UND Style
+        new_annotations = annotations
+        style = n.get("style")
+        tag_annotation = _TAG_ANNOTATIONS.get(tag_name)
+        if style or tag_annotation:
+            new_annotations = dict(annotations)
             # ZUERST: CSS Styles parsen (OneNote verwendet diese!)
-            style = n.get("style")
             if style:
-                style_annotations = parse_style_annotations(str(style))
-                # Merge mit existing annotations (OR-Logik)
-                for key in new_annotations:
-                    if style_annotations[key]:
-                        new_annotations[key] = True
-            
+                _parse_style_annotations(str(style), new_annotations)
             # DANN: HTML-Tags (für andere Quellen)
-            # Bold
-            if tag_name in ("strong", "b"):
-                new_annotations["bold"] = True
-            
-            # Italic
-            elif tag_name in ("em", "i"):
-                new_annotations["italic"] = True
-            
-            # Underline
-            elif tag_name == "u":
-                new_annotations["underline"] = True
-            
-            # Strikethrough
-            elif tag_name in ("strike", "s", "del"):
-                new_annotations["strikethrough"] = True
-            
-            # Code (inline)
-            elif tag_name == "code":
-                new_annotations["code"] = True
-            
-            # Links - spezielle Behandlung
-            if tag_name == "a":
-                href = n.get("href")
-                if href:
-                    # Link-Text mit aktuellen Formatierungen
-                    txt = n.get_text()
-                    if txt:
-                        # OneNote-interne Links erkennen und markieren
-                        link_url, link_suffix = process_onenote_link(href)
-                        display_text = txt + link_suffix if link_suffix else txt
-                        parts.append({
-                            "type": "text",
-                            "text": {"content": display_text, "link": {"url": link_url}},
-                            "annotations": new_annotations.copy()
-                        })
-                    return  # Kinder nicht mehr verarbeiten
-            
-            # Kinder rekursiv verarbeiten
-            for child in n.children:
-                process_node(child, new_annotations)
-    
-    # Verarbeitung starten
-    process_node(node)
-    
-    # Whitespace-only Text-Parts entfernen (führen zu Problemen)
-    parts = [p for p in parts if p["type"] != "text" or p["text"]["content"].strip()]
-    
-    # Notion-Limit: 2000 Zeichen pro rich_text Element
-    for p in parts:
-        if p["type"] == "text" and len(p["text"]["content"]) > 2000:
-            p["text"]["content"] = p["text"]["content"][:2000]
-    
-    # Leere Annotations entfernen (wenn alle False)
-    for p in parts:
-        if "annotations" in p:
-            if not any(p["annotations"].values()):
-                # Alle annotations sind False - entfernen
-                del p["annotations"]
+            if tag_annotation:
+                new_annotations[tag_annotation] = True
+        
+        # Links - spezielle Behandlung
+        if tag_name == "a":
+            href = n.get("href")
+            if href:
+                # Link-Text mit aktuellen Formatierungen
+                txt = n.get_text()
+                if txt:
+                    # OneNote-interne Links erkennen und markieren
+                    link_url, link_suffix = process_onenote_link(href)
+                    display_text = txt + link_suffix if link_suffix else txt
+                    if display_text.strip():
+                        parts.append(_text_part(display_text, new_annotations, link_url))
+                continue  # Kinder nicht mehr verarbeiten
+        
+        # Kinder in Dokumentreihenfolge verarbeiten
+        stack.extend((child, new_annotations) for child in reversed(n.contents))
     
     return parts or [{"type": "text", "text": {"content": ""}}]
 
 
+def _resolve_blocks(blocks: List[Any]) -> List[Dict[str, Any]]:
+    """Upload-Platzhalter (Futures) durch ihre Blöcke ersetzen, fehlgeschlagene entfernen."""
+    resolved = [b.result() if isinstance(b, Future) else b for b in blocks]
+    return [b for b in resolved if b is not None]
+
+
 def html_to_blocks_and_tables(
     html: str,
     site_id: str,
     ms_graph_client,
-    notion_client
+    notion_client,
+    resource_cache: Optional[Dict[str, str]] = None,
+    max_workers: int = UPLOAD_WORKERS
 ) -> Tuple[List[Dict[str, Any]], List[List[List[str]]]]:
     """
     OneNote HTML zu Notion-Blöcken konvertieren.
@@ -339,53 +375,36 @@ def html_to_blocks_and_tables(
         site_id: SharePoint Site-ID
         ms_graph_client: MSGraphClient für Resource-Downloads
         notion_client: NotionClient für Uploads
+        resource_cache: Resource-ID bzw. SHA-256 des Inhalts -> file_upload_id (optional, seitenübergreifend)
+        max_workers: Parallele Download+Upload-Jobs für Bilder/Dateien
         
     Returns:
         (blocks, tables) - Notion-Blöcke und Tabellen
     """
-    soup = BeautifulSoup(html, "html.parser")
+    soup = BeautifulSoup(html, HTML_PARSER)
     blocks: List[Dict[str, Any]] = []
     tables: List[List[List[str]]] = []
+    if resource_cache is None:
+        resource_cache = {}
     
     # Helper-Funktionen für Block-Erstellung
     def add_paragraph_rich(el):
-        blocks.append({
-            "object": "block",
-            "type": "paragraph",
-            "paragraph": {"rich_text": build_rich_text(el)}
-        })
+        blocks.append(make_block("paragraph", {"rich_text": build_rich_text(el)}))
     
     def add_heading(level, el):
-        k = f"heading_{level}"
-        blocks.append({
-            "object": "block",
-            "type": k,
-            k: {"rich_text": build_rich_text(el)}
-        })
+        blocks.append(make_block(f"heading_{level}", {"rich_text": build_rich_text(el)}))
     
     def add_todo(el, checked=False):
-        blocks.append({
-            "object": "block",
-            "type": "to_do",
-            "to_do": {"rich_text": build_rich_text(el), "checked": checked}
-        })
+        blocks.append(make_block("to_do", {"rich_text": build_rich_text(el), "checked": checked}))
     
     def add_quote(el):
-        blocks.append({
-            "object": "block",
-            "type": "quote",
-            "quote": {"rich_text": build_rich_text(el)}
-        })
+        blocks.append(make_block("quote", {"rich_text": build_rich_text(el)}))
     
     def add_code(text):
-        blocks.append({
-            "object": "block",
-            "type": "code",
-            "code": {
-                "rich_text": [{"type": "text", "text": {"content": text}}],
-                "language": "plain_text"
-            }
-        })
+        blocks.append(make_block("code", {
+            "rich_text": [{"type": "text", "text": {"content": text}}],
+            "language": "plain_text"
+        }))
     
     def rewrite_resource_url_to_graph(site_id: str, href: str) -> Optional[str]:
         """OneNote Resource-URL zu Graph API URL umschreiben oder korrigieren.
@@ -399,7 +418,7 @@ def html_to_blocks_and_tables(
         # Fall 1: siteCollections-Format (MUSS umgeschrieben werden!)
         if href.startswith("https://graph.microsoft.com/") and "/siteCollections/" in href:
             # Extrahiere Resource-ID aus URL
-            m = re.search(r"/onenote/resources/([^/$?]+)", href)
+            m = _RE_RESOURCE_ID.search(href)
             if m:
                 res_id = m.group(1)
                 # Korrigiere URL: siteCollections → sites, $value → content
@@ -436,21 +455,88 @@ def html_to_blocks_and_tables(
         try:
             # MS Graph Auth Headers
             headers = ms_graph_client.auth.microsoft.headers
-            r = requests.get(url, headers=headers)
-            r.raise_for_status()
-            
-            raw = r.content
+            r = ms_graph_client.session.get(url, headers=headers, timeout=30, stream=True)
+            try:
+                r.raise_for_status()
+                # Zu große Dateien lehnt Notion ohnehin ab - Body gar nicht erst laden
+                length = r.headers.get("Content-Length", "")
+                if length.isdigit() and int(length) > MAX_UPLOAD_BYTES:
+                    print(f"[⚠] Datei zu groß (>20MB), übersprungen: {orig_url[:100]}")
+                    return None, None, "file"
+                raw = r.content
+            finally:
+                r.close()
             header_ct = r.headers.get("Content-Type", "").split(";")[0].strip() or None
             
             # Content-Type Detection (aus core.utils)
-            from core.utils import detect_content_type_and_filename
-            final_ct, safe_name = detect_content_type_and_filename(raw, header_ct, orig_url)
+            final_ct, safe_name = detect_content_type_and_filename(raw[:SNIFF_BYTES], header_ct, orig_url)
             
             return raw, final_ct, safe_name
         except Exception as e:
             print(f"[⚠] Media fetch failed: {e}")
             return None, None, "file"
     
+    def upload_data(fname: str, data: bytes, ctype: Optional[str]) -> Optional[str]:
+        """Daten hochladen; identischer Inhalt unter anderer Resource-ID nur einmal (SHA-256)."""
+        digest_key = "sha256:" + hashlib.sha256(data).hexdigest()
+        upload_id = resource_cache.get(digest_key)
+        if upload_id:
+            print(f"[♻️] Identischer Inhalt bereits hochgeladen: {upload_id}")
+            return upload_id
+        upload_id = notion_client.upload_file(fname, data, ctype)
+        if upload_id:
+            resource_cache[digest_key] = upload_id
+        return upload_id
+    
+    def upload_image(src: str) -> Optional[Dict[str, Any]]:
+        """Bild herunterladen, zu Notion hochladen und Image-Block liefern (Worker)."""
+        key = resource_cache_key(src)
+        cached = resource_cache.get(key)
+        if cached:
+            print(f"[♻️] Bild bereits hochgeladen: {cached}")
+            return notion_client.create_image_block(cached)
+        data, ctype, fname = fetch_resource(src)
+        if not data:
+            print(f"[❌] Bild-Download fehlgeschlagen: {src[:100]}")
+            return None
+        print(f"[📥] Bild heruntergeladen: {fname} ({len(data)} bytes, {ctype})")
+        upload_id = upload_data(fname, data, ctype)
+        if not upload_id:
+            print(f"[❌] Bild-Upload fehlgeschlagen: {fname}")
+            return None
+        print(f"[✅] Bild hochgeladen: {upload_id}")
+        resource_cache[key] = upload_id
+        return notion_client.create_image_block(upload_id)
+    
+    def upload_file_resource(href: str) -> Optional[Dict[str, Any]]:
+        """Datei herunterladen, zu Notion hochladen und File-Block liefern (Worker)."""
+        key = resource_cache_key(href)
+        cached = resource_cache.get(key)
+        if cached:
+            return notion_client.create_file_block(cached)
+        data, ctype, fname = fetch_resource(href)
+        if not data:
+            return None
+        upload_id = upload_data(fname, data, ctype)
+        if not upload_id:
+            return None
+        resource_cache[key] = upload_id
+        return notion_client.create_file_block(upload_id)
+    
+    def add_image(src: str):
+        """Bild-Job in den Upload-Pool geben; Platzhalter hält die Block-Position."""
+        key = ("image", resource_cache_key(src))
+        if key not in pending_uploads:
+            pending_uploads[key] = upload_pool.submit(upload_image, src)
+        blocks.append(pending_uploads[key])
+    
+    def add_file(href: str):
+        """Datei-Job in den Upload-Pool geben; Platzhalter hält die Block-Position."""
+        key = ("file", resource_cache_key(href))
+        if key not in pending_uploads:
+            pending_uploads[key] = upload_pool.submit(upload_file_resource, href)
+        blocks.append(pending_uploads[key])
+    
     def handle_images_with_split(el: Tag, create_paragraph=True):
         """
         WORKAROUND: Paragraphen aufbrechen und Bilder dazwischen einfügen!
@@ -466,10 +552,6 @@ def html_to_blocks_and_tables(
         if not imgs:
             return False  # Keine Bilder gefunden
         
-        # Clone des Elements für Text-Extraktion
-        import copy
-        el_copy = copy.copy(el)
-        
         # Sammle alle Text-Teile und Bilder in korrekter Reihenfolge
         parts = []
         current_text = []
@@ -481,7 +563,7 @@ def html_to_blocks_and_tables(
                     text_content = ''.join(str(t) for t in current_text).strip()
                     if text_content:
                         # Erstelle temporäres Element für rich_text
-                        temp = BeautifulSoup(f'<span>{text_content}</span>', 'html.parser').span
+                        temp = BeautifulSoup(f'<span>{text_content}</span>', HTML_PARSER).span
                         parts.append(('text', build_rich_text(temp)))
                     current_text = []
                 
@@ -500,7 +582,7 @@ def html_to_blocks_and_tables(
         if current_text:
             text_content = ''.join(str(t) for t in current_text).strip()
             if text_content:
-                temp = BeautifulSoup(f'<span>{text_content}</span>', 'html.parser').span
+                temp = BeautifulSoup(f'<span>{text_content}</span>', HTML_PARSER).span
                 parts.append(('text', build_rich_text(temp)))
         
         # Wenn nur Text (keine Bilder in direkten Kindern), prüfe verschachtelte
@@ -513,17 +595,7 @@ def html_to_blocks_and_tables(
                     src = img.get("data-fullres-src") or img.get("data-src") or img.get("src")
                     if src:
                         print(f"[📸] Bild gefunden: {src[:100]}")
-                        data, ctype, fname = fetch_resource(src)
-                        if data:
-                            print(f"[📥] Bild heruntergeladen: {fname} ({len(data)} bytes, {ctype})")
-                            upload_id = notion_client.upload_file(fname, data, ctype)
-                            if upload_id:
-                                print(f"[✅] Bild hochgeladen: {upload_id}")
-                                blocks.append(notion_client.create_image_block(upload_id))
-                            else:
-                                print(f"[❌] Bild-Upload fehlgeschlagen: {fname}")
-                        else:
-                            print(f"[❌] Bild-Download fehlgeschlagen: {src[:100]}")
+                        add_image(src)
             return len(imgs) > 0
         
         # Erstelle Blöcke in korrekter Reihenfolge
@@ -531,26 +603,12 @@ def html_to_blocks_and_tables(
             if part_type == 'text' and create_paragraph:
                 # Text als Paragraph
                 if content:  # content ist bereits rich_text
-                    blocks.append({
-                        "object": "block",
-                        "type": "paragraph",
-                        "paragraph": {"rich_text": content}
-                    })
+                    blocks.append(make_block("paragraph", {"rich_text": content}))
             elif part_type == 'image':
                 # Bild hochladen und einfügen
                 src = content
                 print(f"[📸] Bild gefunden: {src[:100]}")
-                data, ctype, fname = fetch_resource(src)
-                if data:
-                    print(f"[📥] Bild heruntergeladen: {fname} ({len(data)} bytes, {ctype})")
-                    upload_id = notion_client.upload_file(fname, data, ctype)
-                    if upload_id:
-                        print(f"[✅] Bild hochgeladen: {upload_id}")
-                        blocks.append(notion_client.create_image_block(upload_id))
-                    else:
-                        print(f"[❌] Bild-Upload fehlgeschlagen: {fname}")
-                else:
-                    print(f"[❌] Bild-Download fehlgeschlagen: {src[:100]}")
+                add_image(src)
         
         return True  # Bilder wurden verarbeitet
     
@@ -563,128 +621,127 @@ def html_to_blocks_and_tables(
     # Track bereits verarbeitete Bilder (um Duplikate zu vermeiden)
     processed_imgs = set()
     
-    # Hauptloop: Alle Elemente durchgehen
-    for el in body.descendants:
-        if not isinstance(el, Tag):
-            continue
-        
-        name = el.name.lower()
-        
-        # Headings
-        if name in ("h1", "h2", "h3"):
-            add_heading(int(name[1]), el)
-        
-        # Blockquote
-        elif name == "blockquote":
-            add_quote(el)
-        
-        # Code-Blöcke
-        elif name == "pre":
-            code_el = el.find("code")
-            txt = code_el.get_text() if code_el else el.get_text()
-            add_code(txt.strip())
-        
-        # Listen - mit Nested List Support (max. 3 Ebenen)
-        elif name in ("ul", "ol"):
-            # Nur top-level Listen verarbeiten (nicht verschachtelte)
-            if el.parent and el.parent.name == "li":
-                continue  # Überspringe - wird von Parent verarbeitet
+    # Downloads/Uploads laufen parallel; blocks enthält bis zum Ende Futures als Platzhalter
+    upload_pool = ThreadPoolExecutor(max_workers=max_workers)
+    pending_uploads: Dict[Tuple[str, str], Future] = {}  # gleiche Ressource auf einer Seite nur einmal
+    blocks_full = False
+    try:
+        # Hauptloop: Alle Elemente durchgehen
+        for el in body.descendants:
+            if not isinstance(el, Tag):
+                continue
             
-            list_blocks = process_list_recursive(
-                el, 
-                depth=0, 
-                max_depth=3,
-                checkbox_unicode_true=checkbox_unicode_true,
-                checkbox_unicode_false=checkbox_unicode_false,
-                handle_images_fn=handle_images_with_split,
-                blocks_ref=blocks
-            )
-            blocks.extend(list_blocks)
-        
-        # Paragraphen
-        elif name == "p":
-            # WORKAROUND: Paragraphen mit Bildern aufbrechen!
-            has_images = handle_images_with_split(el, create_paragraph=True)
+            name = el.name.lower()
             
-            if not has_images:
-                # Keine Bilder - normale Verarbeitung
-                # To-Do Detection in Paragraphen
-                is_todo = False
-                checked = False
-                
-                if el.get("data-tag") and "to-do" in el.get("data-tag", "").lower():
-                    is_todo = True
-                
-                txt = el.get_text(" ", strip=True)
-                if txt.startswith(checkbox_unicode_true):
-                    is_todo = True
-                    checked = True
-                elif txt.startswith(checkbox_unicode_false):
-                    is_todo = True
-                    checked = False
-                elif re.match(r"^\s*\[(x|X)\]\s+", txt):
-                    is_todo = True
-                    checked = True
-                elif re.match(r"^\s*\[\s\]\s+", txt):
-                    is_todo = True
+            # Block-Limit erreicht? Erst Platzhalter auflösen - fehlgeschlagene
+            # Uploads zählen nicht mit. Danach nur noch Tabellen sammeln.
+            if not blocks_full and len(blocks) >= MAX_BLOCKS:
+                blocks[:] = _resolve_blocks(blocks)
+                blocks_full = len(blocks) >= MAX_BLOCKS
+            if blocks_full and name != "table":
+                continue
+            
+            # Headings
+            if name in ("h1", "h2", "h3"):
+                add_heading(int(name[1]), el)
+            
+            # Blockquote
+            elif name == "blockquote":
+                add_quote(el)
+            
+            # Code-Blöcke
+            elif name == "pre":
+                code_el = el.find("code")
+                txt = code_el.get_text() if code_el else el.get_text()
+                add_code(txt.strip())
+            
+            # Listen - mit Nested List Support (max. 3 Ebenen)
+            elif name in ("ul", "ol"):
+                # Nur top-level Listen verarbeiten (nicht verschachtelte)
+                if el.parent and el.parent.name == "li":
+                    continue  # Überspringe - wird von Parent verarbeitet
+            
+                list_blocks = process_list_recursive(
+                    el, 
+                    depth=0, 
+                    max_depth=3,
+                    checkbox_unicode_true=checkbox_unicode_true,
+                    checkbox_unicode_false=checkbox_unicode_false,
+                    handle_images_fn=handle_images_with_split,
+                    blocks_ref=blocks
+                )
+                blocks.extend(list_blocks)
+            
+            # Paragraphen
+            elif name == "p":
+                # WORKAROUND: Paragraphen mit Bildern aufbrechen!
+                has_images = handle_images_with_split(el, create_paragraph=True)
+            
+                if not has_images:
+                    # Keine Bilder - normale Verarbeitung
+                    # To-Do Detection in Paragraphen
                     checked = False
-                
-                if is_todo:
-                    add_todo(el, checked=checked)
-                elif el.get_text(strip=True):
-                    add_paragraph_rich(el)
-        
-        # Tabellen
-        elif name == "table":
-            rows = []
-            for tr in el.find_all("tr", recursive=False):
-                cells = [td.get_text(" ", strip=True) for td in tr.find_all(["td", "th"], recursive=False)]
-                rows.append(cells)
-            if rows:
-                tables.append(rows)
-        
-        # WICHTIG: Direkte <img>-Tags (nicht in <p>) verarbeiten!
-        elif name == "img":
-            img_id = id(el)
-            if img_id not in processed_imgs:
-                processed_imgs.add(img_id)
-                src = el.get("data-fullres-src") or el.get("data-src") or el.get("src")
-                if src:
-                    print(f"[📸] Direktes Bild gefunden: {src[:80]}...")
-                    data, ctype, fname = fetch_resource(src)
-                    if data:
-                        print(f"[📥] Bild heruntergeladen: {fname} ({len(data)} bytes, {ctype})")
-                        upload_id = notion_client.upload_file(fname, data, ctype)
-                        if upload_id:
-                            print(f"[✅] Bild hochgeladen: {upload_id}")
-                            blocks.append(notion_client.create_image_block(upload_id))
-                        else:
-                            print(f"[❌] Bild-Upload fehlgeschlagen: {fname}")
-                    else:
-                        print(f"[❌] Bild-Download fehlgeschlagen: {src[:80]}...")
-        
-        # Links mit Dateien
-        elif name == "a":
-            href = el.get("href", "")
-            if "/onenote/resources/" in href:
-                data, ctype, fname = fetch_resource(href)
-                if data:
-                    upload_id = notion_client.upload_file(fname, data, ctype)
-                    if upload_id:
-                        blocks.append(notion_client.create_file_block(upload_id))
+            
+                    dt = el.get("data-tag")
+                    is_todo = bool(dt) and "to-do" in dt.lower()
+            
+                    txt = leading_text(el)
+                    if txt.startswith(checkbox_unicode_true):
+                        is_todo = True
+                        checked = True
+                    elif txt.startswith(checkbox_unicode_false):
+                        is_todo = True
+                        checked = False
+                    elif re.match(r"^\s*\[(x|X)\]\s+", txt):
+                        is_todo = True
+                        checked = True
+                    elif re.match(r"^\s*\[\s\]\s+", txt):
+                        is_todo = True
+                        checked = False
+            
+                    if is_todo:
+                        add_todo(el, checked=checked)
+                    elif el.get_text(strip=True):
+                        add_paragraph_rich(el)
+            
+            # Tabellen
+            elif name == "table":
+                rows = []
+                for tr in el.find_all("tr", recursive=False):
+                    cells = [td.get_text(" ", strip=True) for td in tr.find_all(["td", "th"], recursive=False)]
+                    rows.append(cells)
+                if rows:
+                    tables.append(rows)
+            
+            # WICHTIG: Direkte <img>-Tags (nicht in <p>) verarbeiten!
+            elif name == "img":
+                img_id = id(el)
+                if img_id not in processed_imgs:
+                    processed_imgs.add(img_id)
+                    src = el.get("data-fullres-src") or el.get("data-src") or el.get("src")
+                    if src:
+                        print(f"[📸] Direktes Bild gefunden: {src[:80]}...")
+                        add_image(src)
+            
+            # Links mit Dateien
+            elif name == "a":
+                href = el.get("href", "")
+                if "/onenote/resources/" in href:
+                    add_file(href)
+    finally:
+        upload_pool.shutdown(wait=True)
+    
+    # Platzhalter auflösen (Reihenfolge bleibt erhalten, fehlgeschlagene entfallen)
+    blocks = _resolve_blocks(blocks)
     
     # Fallback: Wenn keine Blöcke erstellt wurden
     if not blocks and soup.get_text(strip=True):
-        blocks.append({
-            "object": "block",
-            "type": "paragraph",
-            "paragraph": {
-                "rich_text": [{"type": "text", "text": {"content": soup.get_text(' ', strip=True)}}]
-            }
-        })
+        blocks.append(make_block("paragraph", {
+            "rich_text": [{"type": "text", "text": {"content": soup.get_text(' ', strip=True)}}]
+        }))
     
-    # Notion-Limit: Max 150 Blöcke pro Request
-    return blocks[:150], tables
+    # Notion-Limit: Max. MAX_BLOCKS Blöcke (Bild-Splits können knapp darüber liegen)
+    return blocks[:MAX_BLOCKS], tables
 
 
 def append_table(notion_client, parent_block_id: str, rows: List[List[str]]):
@@ -711,28 +768,19 @@ def append_table(notion_client, parent_block_id: str, rows: List[List[str]]):
         # Padding: Jede Zeile muss gleich viele Zellen haben
         padded_row = r + [""] * (table_width - len(r))
         cells = [[{"type": "text", "text": {"content": str(c)[:2000]}}] for c in padded_row]
-        row_children.append({
-            "object": "block",
-            "type": "table_row",
-            "table_row": {"cells": cells}
-        })
+        row_children.append(make_block("table_row", {"cells": cells}))
     
     # Table-Block MIT children erstellen (Notion API Requirement!)
-    table_block = {
-        "object": "block",
-        "type": "table",
-        "table": {
-            "table_width": table_width,
-            "has_column_header": len(rows) > 1,  # Erste Zeile als Header wenn > 1 Zeile
-            "has_row_header": False,
-            "children": row_children
-        }
-    }
+    table_block = make_block("table", {
+        "table_width": table_width,
+        "has_column_header": len(rows) > 1,  # Erste Zeile als Header wenn > 1 Zeile
+        "has_row_header": False,
+        "children": row_children
+    })
     
     # Table mit allen Zeilen auf einmal erstellen
     try:
         notion_client.append_blocks(parent_block_id, [table_block])
-        time.sleep(0.12)  # Rate limiting
     except Exception as e:
         print(f"[⚠] Table creation failed: {e}")
 
@@ -749,7 +797,7 @@ def parse_onenote_html(html: str) -> Tuple[List[Dict[str, Any]], List[List[List[
     print("[⚠] Nutze html_to_blocks_and_tables() mit ms_graph_client und notion_client!")
     
     # Dummy-Parser ohne Bild-Support
-    soup = BeautifulSoup(html, "html.parser")
+    soup = BeautifulSoup(html, HTML_PARSER)
     blocks = []
     tables = []
     
@@ -757,11 +805,9 @@ def parse_onenote_html(html: str) -> Tuple[List[Dict[str, Any]], List[List[List[
     for p in soup.find_all("p"):
         text = p.get_text(strip=True)
         if text:
-            blocks.append({
-                "object": "block",
-                "type": "paragraph",
-                "paragraph": {"rich_text": [{"type": "text", "text": {"content": text[:2000]}}]}
-            })
+            blocks.append(make_block("paragraph", {
+                "rich_text": [{"type": "text", "text": {"content": text[:2000]}}]
+            }))
     
     for table in soup.find_all("table"):
         rows = []
@@ -1,3 +1,12 @@
 """
 Planner-zu-Notion Migrationstool.
 """
+
+# Von CLI und Web-GUI gemeinsam genutzte Parallelität:
+
+# Parallele Seiten-Erstellungen: etwas mehr Threads als Requests/s, damit die
+# Latenz überlappt; das Notion-Rate-Limit (3/s) begrenzt weiterhin global
+PAGE_WORKERS = 5
+
+# Parallele $batch-Requests beim Laden der Task-Details (je bis zu 20 Tasks)
+DETAIL_WORKERS = 4
@@ -10,13 +10,19 @@ Dieses Modul orchestriert die verschiedenen Komponenten der Planner-Migration:
 """
 import argparse
 import sys
+import traceback
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Iterable, Tuple
 
 # Core-Module importieren
 from core.auth import auth_manager, AuthConfig
 from core.notion_client import NotionClient
 from core.utils import validate_file_exists
+from . import DETAIL_WORKERS, PAGE_WORKERS
+
+# Fortschritt ohne --verbose nur alle N Zeilen ausgeben
+PROGRESS_EVERY = 50
 
 
 class PlannerMigrationCLI:
@@ -39,6 +45,9 @@ Beispiele:
   # Mit Personen-Mapping
   python -m tools.planner_migration.cli --plan-id PLAN_ID --database DB_ID --people-map mapping.csv
 
+  # Erneuter Lauf: nur neue Tasks importieren
+  python -m tools.planner_migration.cli --plan-id PLAN_ID --database DB_ID --skip-existing
+
   # Mit detaillierten Ausgaben
   python -m tools.planner_migration.cli --plan-id PLAN_ID --database DB_ID --verbose
 
@@ -55,6 +64,12 @@ Plan ID finden:
 
         # Erweiterte Optionen
         parser.add_argument("--people-map", help="CSV für Personen-Mapping (Name → Notion Email)")
+        parser.add_argument("--workers", type=int, default=PAGE_WORKERS,
+                          help=f"Parallele Seiten-Erstellungen (Standard: {PAGE_WORKERS})")
+        parser.add_argument("--skip-existing", action="store_true",
+                          help="Tasks überspringen, deren Vorgangsnummer bereits in der Datenbank steht")
+        parser.add_argument("--schema-cache", action="store_true",
+                          help="Schema-Updates überspringen, wenn der letzte Lauf alle Properties/Optionen angelegt hat")
         parser.add_argument("--verbose", "-v", action="store_true",
                           help="Detaillierte Ausgaben")
 
@@ -120,7 +135,7 @@ Plan ID finden:
         from core.ms_graph_client import MSGraphClient
         from .planner_api_mapper import create_planner_api_mapper
         from .people_mapper import create_people_mapper
-        from .notion_mapper import create_notion_mapper
+        from .notion_mapper import create_notion_mapper, DEFAULT_SCHEMA_CACHE_DIR
 
         print("[🚀] Starte Migration...")
 
@@ -135,53 +150,42 @@ Plan ID finden:
         group_id = plan.get("owner")
         print(f"[✅] Plan gefunden: {plan_title}")
         
-        # 2b. Plan-Details für Category-Descriptions abrufen
-        try:
-            plan_details = ms_client.get_planner_plan_details(self.args.plan_id)
-            category_descriptions = plan_details.get("categoryDescriptions", {})
-            if self.args.verbose:
-                print(f"[i] {len(category_descriptions)} Categories gefunden")
-        except Exception as e:
-            if self.args.verbose:
-                print(f"[⚠️] Plan-Details konnten nicht abgerufen werden: {e}")
-            category_descriptions = {}
-        
-        # 3. Buckets abrufen
-        print("[i] Rufe Buckets ab...")
-        buckets = ms_client.list_planner_buckets(self.args.plan_id)
-        print(f"[✅] {len(buckets)} Buckets gefunden")
-        
-        # 4. Tasks abrufen
-        print("[i] Rufe Tasks ab...")
-        tasks = ms_client.list_planner_tasks(self.args.plan_id)
-        print(f"[✅] {len(tasks)} Tasks gefunden")
-        
-        # 5. Task-Details abrufen
-        print("[i] Rufe Task-Details ab...")
-        tasks_details = {}
-        for i, task in enumerate(tasks):
-            task_id = task.get("id")
-            if task_id:
-                try:
-                    details = ms_client.get_task_details(task_id)
-                    tasks_details[task_id] = details
-                    if self.args.verbose:
-                        print(f"  [{i+1}/{len(tasks)}] Details für '{task.get('title', 'Unbenannt')}'")
-                except Exception as e:
-                    if self.args.verbose:
-                        print(f"  [⚠️] Details für Task {task_id} nicht abrufbar: {e}")
-        
-        print(f"[✅] Details für {len(tasks_details)} Tasks abgerufen")
-        
-        # 6. Gruppenmitglieder abrufen
-        group_members = []
-        if group_id:
+        # 2b./3./6. Plan-Details, Buckets und Gruppenmitglieder hängen nur von
+        # plan_id/group_id ab - parallel laden, während die Tasks gelesen werden
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            details_future = pool.submit(ms_client.get_planner_plan_details, self.args.plan_id)
+            buckets_future = pool.submit(ms_client.list_planner_buckets, self.args.plan_id)
+            members_future = pool.submit(ms_client.get_group_members, group_id) if group_id else None
+
+            # 4./5. Tasks und Task-Details abrufen (Details laden, während weitere Task-Seiten kommen)
+            print("[i] Rufe Buckets, Tasks und Task-Details ab...")
+            tasks, tasks_details = self._fetch_task_details(
+                ms_client, ms_client.iter_planner_tasks(self.args.plan_id)
+            )
+
+            # Plan-Details für Category-Descriptions (optional)
             try:
-                print("[i] Rufe Gruppenmitglieder ab...")
-                group_members = ms_client.get_group_members(group_id)
-                print(f"[✅] {len(group_members)} Mitglieder gefunden")
+                category_descriptions = details_future.result().get("categoryDescriptions", {})
+                if self.args.verbose:
+                    print(f"[i] {len(category_descriptions)} Categories gefunden")
             except Exception as e:
-                print(f"[⚠️] Gruppenmitglieder konnten nicht abgerufen werden: {e}")
+                if self.args.verbose:
+                    print(f"[⚠️] Plan-Details konnten nicht abgerufen werden: {e}")
+                category_descriptions = {}
+
+            buckets = buckets_future.result()
+            print(f"[✅] {len(buckets)} Buckets gefunden")
+            print(f"[✅] {len(tasks)} Tasks gefunden")
+            print(f"[✅] Details für {len(tasks_details)} Tasks abgerufen")
+
+            # Gruppenmitglieder (optional)
+            group_members = []
+            if members_future:
+                try:
+                    group_members = members_future.result()
+                    print(f"[✅] {len(group_members)} Mitglieder gefunden")
+                except Exception as e:
+                    print(f"[⚠️] Gruppenmitglieder konnten nicht abgerufen werden: {e}")
         
         # 7. API-Mapper erstellen und Daten konvertieren
         print("[i] Konvertiere Daten...")
@@ -209,55 +213,127 @@ Plan ID finden:
             if unmapped:
                 print(f"[⚠️] {len(unmapped)} Personen konnten nicht gemappt werden")
 
-        # 9. Notion-Mapper initialisieren
-        notion_mapper = create_notion_mapper(self.notion)
+        # 9. Notion-Mapper initialisieren (Schema-Cache nur mit --schema-cache)
+        schema_cache_dir = DEFAULT_SCHEMA_CACHE_DIR if self.args.schema_cache else None
+        notion_mapper = create_notion_mapper(self.notion, schema_cache_dir)
 
         # 10. Datenbank vorbereiten
         database_id = self.args.database
         print(f"[i] Bereite Datenbank vor...")
-        notion_mapper.prepare_database_for_import(database_id, rows)
+        notion_mapper.prepare_database_for_import(database_id, rows, api_mapper.option_values)
 
         # 11. Daten importieren
         self._import_data(notion_mapper, database_id, rows, people_mapper)
 
 
+    def _fetch_task_details(self, ms_client, task_iter: Iterable[Dict]) -> Tuple[List[Dict], Dict[str, Dict]]:
+        """
+        Tasks einlesen und ihre Details per Graph-$batch abrufen.
+        
+        Sobald BATCH_LIMIT Task-IDs vorliegen, startet der $batch-Request im Pool -
+        die Details laden also parallel zum Nachladen weiterer Task-Seiten.
+        
+        Returns:
+            (Tasks, Dict Task-ID -> Details)
+        """
+        tasks = []
+        tasks_details = {}
+        with ThreadPoolExecutor(max_workers=DETAIL_WORKERS) as pool:
+            futures = []
+            chunk = []
+            for task in task_iter:
+                tasks.append(task)
+                if task.get("id"):
+                    chunk.append(task["id"])
+                if len(chunk) == ms_client.BATCH_LIMIT:
+                    futures.append((chunk, pool.submit(ms_client.get_task_details_batch, chunk)))
+                    chunk = []
+            if chunk:
+                futures.append((chunk, pool.submit(ms_client.get_task_details_batch, chunk)))
+
+            for chunk, future in futures:
+                try:
+                    tasks_details.update(future.result())
+                except Exception as e:
+                    if self.args.verbose:
+                        print(f"  [⚠️] Details für {len(chunk)} Tasks nicht abrufbar: {e}")
+
+        if self.args.verbose:
+            for i, task in enumerate(tasks):
+                task_id = task.get("id")
+                if task_id in tasks_details:
+                    print(f"  [{i+1}/{len(tasks)}] Details für '{task.get('title', 'Unbenannt')}'")
+                elif task_id:
+                    print(f"  [⚠️] Details für Task {task_id} nicht abrufbar")
+        return tasks, tasks_details
+
     def _import_data(self, notion_mapper, database_id: str, rows: List[Dict],
                     people_mapper) -> None:
         """Daten in Notion importieren."""
+        # Nur mit --skip-existing: doppelte und bereits in Notion vorhandene Tasks überspringen
+        skipped_count = 0
+        if self.args.skip_existing:
+            rows, skipped_count = notion_mapper.filter_new_rows(database_id, rows)
+            print(f"[i] {skipped_count} Einträge bereits vorhanden oder doppelt - übersprungen")
         print(f"[i] Importiere {len(rows)} Einträge...")
 
         success_count = 0
         error_count = 0
+        total = len(rows)
+        verbose = self.args.verbose
+
+        with ThreadPoolExecutor(max_workers=max(1, self.args.workers)) as pool:
+            # Properties und Blöcke sequentiell erstellen, Seiten parallel anlegen
+            # (das Notion-Rate-Limit gilt global über alle Threads)
+            jobs = []
+            for row in rows:
+                try:
+                    properties = notion_mapper.build_properties_for_row(row, people_mapper)
+                    children = notion_mapper.build_children_blocks(row)
+                    jobs.append((row, pool.submit(self.notion.create_page, database_id, properties, children)))
+                except Exception as e:
+                    jobs.append((row, e))
 
-        for i, row in enumerate(rows):
-            try:
-                # Properties und Blöcke erstellen
-                properties = notion_mapper.build_properties_for_row(row, people_mapper)
-                children = notion_mapper.build_children_blocks(row)
-
-                # Seite erstellen
-                self.notion.create_page(database_id, properties, children)
-                
-                success_count += 1
-                task_name = row.get('Name', 'Unbenannt')
-                print(f"[{i+1}/{len(rows)}] Erstellt: {task_name}")
+            # Fortschrittszeilen gesammelt schreiben (ein write pro PROGRESS_EVERY Zeilen)
+            pending = []
+            for i, (row, job) in enumerate(jobs):
+                try:
+                    if isinstance(job, Exception):
+                        raise job
+                    job.result()
+
+                    success_count += 1
+                    if verbose:
+                        pending.append(f"[{i+1}/{total}] Erstellt: {row.get('Name', 'Unbenannt')}\n")
+                    if (i + 1) % PROGRESS_EVERY == 0 or i + 1 == total:
+                        if not verbose:
+                            pending.append(f"[{i+1}/{total}] {success_count} erstellt, {error_count} Fehler\n")
+                        sys.stdout.write("".join(pending))
+                        sys.stdout.flush()
+                        pending.clear()
 
-            except Exception as e:
-                error_count += 1
-                print(f"[❌] Fehler bei Zeile {i+1}: {e}")
-                if self.args.verbose:
-                    import traceback
-                    traceback.print_exc()
-
-        # Zusammenfassung
-        print("\n" + "=" * 50)
-        print("📊 MIGRATIONS-ZUSAMMENFASSUNG")
-        print("=" * 50)
-        print(f"✅ Erfolgreich: {success_count}")
-        print(f"❌ Fehler: {error_count}")
-        print(f"📈 Erfolgsrate: {success_count/(success_count+error_count)*100:.1f}%" if (success_count+error_count) > 0 else "📈 Erfolgsrate: 0%")
-        print(f"🗃️ Datenbank: {database_id}")
-        print("=" * 50)
+                except Exception as e:
+                    error_count += 1
+                    # Gesammelte Zeilen zuerst ausgeben, damit die Reihenfolge stimmt
+                    sys.stdout.write("".join(pending))
+                    pending.clear()
+                    print(f"[❌] Fehler bei Zeile {i+1}: {e}")
+                    if verbose:
+                        traceback.print_exc()
+
+        # Zusammenfassung (jede Zeile zählt entweder als Erfolg oder als Fehler)
+        rate = f"{success_count / total * 100:.1f}%" if total else "0%"
+        print("\n".join((
+            "\n" + "=" * 50,
+            "📊 MIGRATIONS-ZUSAMMENFASSUNG",
+            "=" * 50,
+            f"✅ Erfolgreich: {success_count}",
+            f"❌ Fehler: {error_count}",
+            f"⏭️ Übersprungen: {skipped_count}",
+            f"📈 Erfolgsrate: {rate}",
+            f"🗃️ Datenbank: {database_id}",
+            "=" * 50,
+        )))
 
 
 def main():
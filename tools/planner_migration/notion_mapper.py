@@ -8,12 +8,57 @@ Dieses Modul behandelt:
 - Notion-Blöcke für Beschreibung und Checklisten erstellen
 - Datenbankschema-Management
 """
+import json
 import re
-from typing import Dict, List, Any, Optional
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Any, Optional, Set, Tuple
 
 # Core-Module importieren
 from core.notion_client import NotionClient
 
+# Checklisten-Zähler "erledigt/gesamt", z.B. "3 / 5"
+_DONE_RE = re.compile(r"^\s*(\d+)\s*/\s*(\d+)\s*$")
+
+# Zuletzt vorbereitetes Schema pro Datenbank (Properties + Optionen), für Folgeläufe.
+# Nur auf Wunsch (CLI: --schema-cache): der Cache wird nicht gegen die Datenbank
+# geprüft und kennt daher keine in Notion gelöschten Properties/Optionen
+DEFAULT_SCHEMA_CACHE_DIR = "~/.cache/move2notion"
+
+# Deutsche/englische Boolean-Werte
+_TRUTHY_DE = frozenset(("ja", "true", "1", "x", "yes", "wahr"))
+
+
+# Property-Builder pro Typ (Eingabe: bereits als String vorliegender Zellwert).
+# Werte mit wenigen Ausprägungen werden gecacht - die Dicts werden von mehreren
+# Seiten geteilt und dürfen daher nicht verändert werden (nur JSON-serialisiert).
+@lru_cache(maxsize=2048)
+def _select_prop(text: str) -> Dict[str, Any]:
+    return {"select": {"name": text}}
+
+
+@lru_cache(maxsize=4096)
+def _date_prop(text: str) -> Dict[str, Any]:
+    return {"date": {"start": text}}
+
+
+@lru_cache(maxsize=64)
+def _checkbox_prop(text: str) -> Dict[str, Any]:
+    return {"checkbox": text.lower() in _TRUTHY_DE}
+
+
+def _rich_text_prop(text: str) -> Dict[str, Any]:
+    return {"rich_text": [{"type": "text", "text": {"content": text}}]}
+
+
+@lru_cache(maxsize=2048)
+def _tags_prop(text: str) -> Optional[Dict[str, Any]]:
+    # Ein Durchlauf: trimmen, leere verwerfen, doppelte entfernen (Reihenfolge bleibt)
+    tag_names = dict.fromkeys(tag for tag in (part.strip() for part in text.split(",")) if tag)
+    if not tag_names:
+        return None
+    return {"multi_select": [{"name": name} for name in tag_names]}
+
 
 class NotionMapper:
     """Konvertiert verarbeitete Planner-Daten in Notion-Format."""
@@ -36,91 +81,170 @@ class NotionMapper:
         "Vorgangsnummer (Planner)": {"rich_text": {}},
     }
 
-    def __init__(self, notion_client: NotionClient):
+    # Spalten nach Property-Typ (für build_properties_for_row)
+    _SELECT_PROPS = frozenset(("Bucket", "Status", "Priorität"))
+    _DATE_PROPS = frozenset(("Erstellungsdatum", "Startdatum", "Fälligkeitsdatum", "Abgeschlossen am"))
+    _CHECKBOX_PROPS = frozenset(("Ist wiederkehrend", "Verspätet"))
+    _RICHTEXT_PROPS = frozenset(("Beschreibung", "Vorgangsnummer (Planner)"))
+    # Eindeutige Task-ID (erkennt doppelte bzw. bereits importierte Tasks)
+    UNIQUE_PROPERTY = "Vorgangsnummer (Planner)"
+
+    # Select-Properties, deren Optionen vor dem Import angelegt werden (ohne Tags)
+    _SCALAR_OPTION_PROPS = ("Bucket", "Status", "Priorität")
+
+    # Feste Spalte → Builder (ein Dict-Lookup statt Typ-Kaskade pro Zelle)
+    _PROPERTY_BUILDERS = {
+        **dict.fromkeys(_SELECT_PROPS, _select_prop),
+        **dict.fromkeys(_DATE_PROPS, _date_prop),
+        **dict.fromkeys(_CHECKBOX_PROPS, _checkbox_prop),
+        **dict.fromkeys(_RICHTEXT_PROPS, _rich_text_prop),
+        "Tags": _tags_prop,
+    }
+
+    def __init__(self, notion_client: NotionClient, schema_cache_dir: Optional[str] = None):
         self.notion = notion_client
+        self.schema_cache_dir = Path(schema_cache_dir).expanduser() if schema_cache_dir else None
         self._notion_users_cache = None  # Cache für Notion-Benutzer (E-Mail → ID)
+        self._email_ids_cache: Dict[Tuple[str, ...], List[str]] = {}  # E-Mail-Liste → User-IDs
+        self._db_cache: Dict[str, Dict[str, Any]] = {}  # Datenbank-ID → Datenbank-Objekt
+        self._verified_dbs: Set[str] = set()  # Datenbanken mit vollständigem Basis-Schema
+        self._page_index: Dict[Tuple[str, str], Dict[str, str]] = {}  # (DB-ID, Property) → Wert → Page-ID
+
+    def get_database(self, database_id: str) -> Dict[str, Any]:
+        """Datenbank-Objekt abrufen (einmal pro Datenbank, danach aus dem Cache)."""
+        if database_id not in self._db_cache:
+            self._db_cache[database_id] = self.notion.get_database(database_id)
+        return self._db_cache[database_id]
+
+    def _update_database(self, database_id: str, properties: Dict[str, Any]) -> Dict[str, Any]:
+        """Datenbank aktualisieren und Cache mit der Antwort (neues Schema) ersetzen."""
+        updated = self.notion.update_database(database_id, properties)
+        if updated:
+            self._db_cache[database_id] = updated
+        return updated
+
+    def _missing_properties(self, db: Dict[str, Any]) -> Dict[str, Any]:
+        """Basis-Properties, die in der Datenbank fehlen."""
+        existing_props = db.get("properties", {})
+        return {
+            prop_name: prop_config
+            for prop_name, prop_config in self.BASE_PROPERTIES.items()
+            if prop_name not in existing_props
+        }
+
+    def _select_options_patch(self, db: Dict[str, Any], property_name: str,
+                              option_names: List[str]) -> Tuple[Optional[Dict[str, Any]], int]:
+        """
+        Update-Payload für fehlende Select-Optionen einer Property (oder None)
+        und Anzahl der neuen Optionen.
+        
+        Fehlt die Property noch in der Datenbank, wird der Typ aus BASE_PROPERTIES
+        genommen, sodass sie im selben Update mit ihren Optionen angelegt wird.
+        """
+        prop = db.get("properties", {}).get(property_name)
+        if prop:
+            prop_type = prop["type"]
+            existing = prop.get(prop_type, {}).get("options", [])
+        elif property_name in self.BASE_PROPERTIES:
+            prop_type = next(iter(self.BASE_PROPERTIES[property_name]))
+            existing = []
+        else:
+            return None, 0
+
+        if prop_type not in ("select", "multi_select"):
+            return None, 0
+
+        existing_names = {opt["name"] for opt in existing}
+        new_options = [name for name in option_names if name and name not in existing_names]
+        if not new_options:
+            return None, 0
+
+        # Bestehende Optionen + neue Optionen
+        return {prop_type: {"options": existing + [{"name": name} for name in new_options]}}, len(new_options)
+
+    def _schema_cache_file(self, database_id: str) -> Optional[Path]:
+        """Pfad der Schema-Cache-Datei einer Datenbank (oder None, wenn deaktiviert)."""
+        if not self.schema_cache_dir:
+            return None
+        return self.schema_cache_dir / f"schema_{database_id.replace('-', '')}.json"
+
+    def _load_schema_cache(self, database_id: str) -> Dict[str, List[str]]:
+        """Beim letzten Lauf vorbereitete Properties und Optionen (Property → Optionen)."""
+        path = self._schema_cache_file(database_id)
+        if not path or not path.exists():
+            return {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f).get("properties", {})
+        except Exception as e:
+            print(f"[Warning] Schema-Cache konnte nicht geladen werden: {e}")
+            return {}
+
+    def _save_schema_cache(self, database_id: str, properties: Dict[str, List[str]]) -> None:
+        """Vorbereitete Properties und Optionen für Folgeläufe speichern."""
+        path = self._schema_cache_file(database_id)
+        if not path:
+            return
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"properties": properties}, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            print(f"[Warning] Schema-Cache konnte nicht gespeichert werden: {e}")
 
     def ensure_database_schema(self, database_id: str) -> None:
         """Stellt sicher, dass Datenbank alle erforderlichen Properties hat."""
-        try:
-            current_db = self.notion.get_database(database_id)
-            existing_props = current_db.get("properties", {})
+        # In diesem Prozess bereits geprüft - das Schema kann nicht zurückfallen
+        if database_id in self._verified_dbs:
+            return
 
-            # Fehlende Properties hinzufügen
-            missing_props = {}
-            for prop_name, prop_config in self.BASE_PROPERTIES.items():
-                if prop_name not in existing_props:
-                    missing_props[prop_name] = prop_config
+        try:
+            missing_props = self._missing_properties(self.get_database(database_id))
 
             if missing_props:
-                self.notion.update_database(database_id, missing_props)
+                self._update_database(database_id, missing_props)
                 print(f"[i] {len(missing_props)} Properties zur Datenbank hinzugefügt")
+            self._verified_dbs.add(database_id)
 
         except Exception as e:
+            self._verified_dbs.discard(database_id)
             print(f"[Warning] Schema-Prüfung fehlgeschlagen: {e}")
 
     def add_select_options_if_needed(self, database_id: str, property_name: str,
                                   option_names: List[str]) -> None:
         """Fehlende Select-Optionen zur Datenbank hinzufügen."""
         try:
-            db = self.notion.get_database(database_id)
-            prop = db["properties"].get(property_name)
-
-            if not prop or prop["type"] not in ["select", "multi_select"]:
+            db = self.get_database(database_id)
+            if property_name not in db.get("properties", {}):
                 return
 
-            existing_options = {opt["name"] for opt in prop.get(prop["type"], {}).get("options", [])}
-            new_options = [name for name in option_names if name and name not in existing_options]
-
-            if new_options:
-                # Bestehende Optionen + neue Optionen
-                all_options = prop.get(prop["type"], {}).get("options", []) + [{"name": name} for name in new_options]
-                self.notion.update_database(database_id, {
-                    property_name: {prop["type"]: {"options": all_options}}
-                })
-                print(f"[i] {len(new_options)} neue Optionen für '{property_name}' hinzugefügt")
+            patch, added = self._select_options_patch(db, property_name, option_names)
+            if patch:
+                self._update_database(database_id, {property_name: patch})
+                print(f"[i] {added} neue Optionen für '{property_name}' hinzugefügt")
 
         except Exception as e:
             print(f"[Warning] Option-Update fehlgeschlagen für '{property_name}': {e}")
 
     def build_properties_for_row(self, row: Dict[str, Any], people_mapper) -> Dict[str, Any]:
         """Notion-Properties für eine Datenzeile erstellen."""
+        name = row.get("Name", "")
         properties = {
-            "Name": {"title": [{"type": "text", "text": {"content": str(row.get("Name", ""))}}]}
+            "Name": {"title": [{"type": "text", "text": {"content": name if isinstance(name, str) else str(name)}}]}
         }
 
-        # Select-Properties
-        for prop_name in ["Bucket", "Status", "Priorität"]:
-            value = row.get(prop_name)
-            if value:
-                properties[prop_name] = {"select": {"name": str(value)}}
-
-        # Multi-Select (Tags)
-        tags_value = row.get("Tags")
-        if tags_value:
-            tag_names = [tag.strip() for tag in str(tags_value).split(",") if tag.strip()]
-            if tag_names:
-                properties["Tags"] = {"multi_select": [{"name": name} for name in tag_names]}
-
-        # Datums-Properties
-        for prop_name in ["Erstellungsdatum", "Startdatum", "Fälligkeitsdatum", "Abgeschlossen am"]:
-            value = row.get(prop_name)
-            if value:
-                properties[prop_name] = {"date": {"start": str(value)}}
-
-        # Checkbox-Properties
-        for prop_name in ["Ist wiederkehrend", "Verspätet"]:
-            value = row.get(prop_name)
-            if value:
-                # Deutsche Boolean-Werte parsen
-                is_checked = str(value).lower() in ["ja", "true", "1", "x", "yes"]
-                properties[prop_name] = {"checkbox": is_checked}
-
-        # Rich-Text-Properties
-        for prop_name in ["Beschreibung", "Vorgangsnummer (Planner)"]:
-            value = row.get(prop_name)
-            if value:
-                properties[prop_name] = {"rich_text": [{"type": "text", "text": {"content": str(value)}}]}
+        # Einfache Properties: ein Durchlauf über die Zeile, Builder per Spaltenname
+        builders = self._PROPERTY_BUILDERS
+        for prop_name, value in row.items():
+            if not value:
+                continue
+            build = builders.get(prop_name)
+            if build is None:
+                continue
+            # Werte sind meist schon Strings - str() nur wenn nötig
+            prop = build(value if isinstance(value, str) else str(value))
+            if prop is not None:
+                properties[prop_name] = prop
 
         # People-Properties - E-Mail-basiert (CSV-Mapper optional für Kompatibilität)
         emails = row.get("Zugewiesen an (Emails)", [])
@@ -151,7 +275,7 @@ class NotionMapper:
                 "object": "block",
                 "type": "paragraph",
                 "paragraph": {
-                    "rich_text": [{"type": "text", "text": {"content": str(description)}}]
+                    "rich_text": [{"type": "text", "text": {"content": description if isinstance(description, str) else str(description)}}]
                 }
             })
 
@@ -180,8 +304,9 @@ class NotionMapper:
             if checklist_raw or checklist_done:
                 # Erledigt/Gesamt-Zähler
                 if checklist_done:
-                    done_pattern = re.compile(r"^\s*(\d+)\s*/\s*(\d+)\s*$")
-                    match = done_pattern.match(str(checklist_done))
+                    done_text = checklist_done if isinstance(checklist_done, str) else str(checklist_done)
+                    # Ohne genau einen "/" kann der Zähler nicht passen - Regex sparen
+                    match = _DONE_RE.match(done_text) if done_text.count("/") == 1 else None
                     if match:
                         blocks.append({
                             "object": "block",
@@ -206,48 +331,103 @@ class NotionMapper:
 
         return blocks
 
+    def load_users(self) -> None:
+        """Alle Notion-Benutzer einmalig laden (E-Mail → User-ID)."""
+        self._notion_users_cache = {}
+        self._email_ids_cache.clear()
+        try:
+            users = self.notion.list_users()
+        except Exception as e:
+            print(f"[⚠️] Notion-Benutzer konnten nicht abgerufen werden: {e}")
+            return
+        for user in users:
+            user_email = user.get("person", {}).get("email") if user.get("type") == "person" else None
+            if user_email:
+                self._notion_users_cache[user_email.casefold()] = user["id"]
+
     def _get_notion_user_ids_for_emails(self, emails: List[str]) -> List[str]:
-        """E-Mails zu Notion User-IDs mappen."""
+        """E-Mails zu Notion User-IDs mappen (reiner Lookup im Benutzer-Cache)."""
         if not emails:
             return []
         
-        # Cache initialisieren falls nötig
         if self._notion_users_cache is None:
-            self._notion_users_cache = {}
-            try:
-                users = self.notion.list_users()
-                for user in users:
-                    user_email = user.get("person", {}).get("email") if user.get("type") == "person" else None
-                    if user_email:
-                        self._notion_users_cache[user_email.lower()] = user["id"]
-            except Exception as e:
-                print(f"[⚠️] Notion-Benutzer konnten nicht abgerufen werden: {e}")
-                return []
-        
-        # E-Mails zu IDs mappen
-        user_ids = []
-        for email in emails:
-            email_lower = email.lower()
-            if email_lower in self._notion_users_cache:
-                user_ids.append(self._notion_users_cache[email_lower])
+            self.load_users()
         
-        return user_ids
+        # Gleiche Zuweisungen wiederholen sich über viele Tasks
+        key = tuple(emails)
+        cached = self._email_ids_cache.get(key)
+        if cached is None:
+            users = self._notion_users_cache
+            cached = [users[email] for email in (e.casefold() for e in emails) if email in users]
+            self._email_ids_cache[key] = cached
+        return cached
 
     def find_existing_page(self, database_id: str, unique_property: str, unique_value: str) -> Optional[str]:
-        """Bestehende Seite anhand einer eindeutigen Property finden."""
+        """
+        Bestehende Seite anhand einer eindeutigen Property finden.
+        
+        Nutzt den per prefetch_page_index geladenen Index (ohne API-Call),
+        sonst eine Einzelabfrage.
+        """
         if not unique_value:
             return None
 
-        return self.notion.find_page_by_property(database_id, unique_property, unique_value)
+        page_index = self._page_index.get((database_id, unique_property))
+        if page_index is not None:
+            return page_index.get(unique_value)
 
-    def prepare_database_for_import(self, database_id: str, processed_data: List[Dict[str, Any]]) -> None:
-        """Datenbank auf Import vorbereiten (Schema + Optionen)."""
-        print("[i] Bereite Datenbank vor...")
-
-        # 1. Schema sicherstellen
-        self.ensure_database_schema(database_id)
+        return self.notion.find_page_by_property(database_id, unique_property, unique_value)
 
-        # 2. Select-Optionen sammeln und hinzufügen
+    def prefetch_page_index(self, database_id: str, unique_property: str) -> Dict[str, str]:
+        """
+        Alle Seiten mit gesetzter eindeutiger Property einmalig laden (paginiert).
+        
+        Returns:
+            Dict Property-Wert → Page-ID (auch von find_existing_page genutzt)
+        """
+        page_index: Dict[str, str] = {}
+        filter_obj = {"property": unique_property, "rich_text": {"is_not_empty": True}}
+        cursor = None
+        while True:
+            response = self.notion.query_database(database_id, filter_obj, start_cursor=cursor)
+            for page in response.get("results", []):
+                prop = page.get("properties", {}).get(unique_property, {})
+                parts = prop.get("rich_text") or prop.get("title") or []
+                text = "".join(part.get("plain_text") or part.get("text", {}).get("content", "") for part in parts)
+                if text:
+                    page_index.setdefault(text, page["id"])
+            if not response.get("has_more"):
+                break
+            cursor = response.get("next_cursor")
+
+        self._page_index[(database_id, unique_property)] = page_index
+        return page_index
+
+    def filter_new_rows(self, database_id: str, rows: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Doppelte und bereits importierte Zeilen (gleiche Planner-Vorgangsnummer) entfernen.
+        
+        Returns:
+            (zu importierende Zeilen, Anzahl übersprungener Zeilen)
+        """
+        try:
+            seen = set(self.prefetch_page_index(database_id, self.UNIQUE_PROPERTY))
+        except Exception as e:
+            print(f"[Warning] Bestehende Einträge konnten nicht abgefragt werden: {e}")
+            seen = set()
+
+        new_rows = []
+        for row in rows:
+            key = row.get(self.UNIQUE_PROPERTY)
+            if key:
+                if key in seen:
+                    continue
+                seen.add(key)
+            new_rows.append(row)
+        return new_rows, len(rows) - len(new_rows)
+
+    def _collect_option_values(self, processed_data: List[Dict[str, Any]]) -> Dict[str, set]:
+        """Select-Optionen (Bucket, Status, Priorität, Tags) aus allen Zeilen sammeln."""
         option_mappings = {
             "Bucket": set(),
             "Status": set(),
@@ -255,24 +435,86 @@ class NotionMapper:
             "Tags": set()
         }
 
-        for row in processed_data:
-            for prop_name in option_mappings.keys():
+        for prop_name in self._SCALAR_OPTION_PROPS:
+            options = option_mappings[prop_name]
+            for row in processed_data:
                 value = row.get(prop_name)
                 if value:
-                    if prop_name == "Tags":
-                        # Tags aufsplitten
-                        tags = [tag.strip() for tag in str(value).split(",") if tag.strip()]
-                        option_mappings[prop_name].update(tags)
-                    else:
-                        option_mappings[prop_name].add(str(value))
-
-        # Optionen hinzufügen
+                    options.add(value if isinstance(value, str) else str(value))
+
+        # Tags aufsplitten (jeder unterschiedliche Tag-Text nur einmal)
+        tag_texts = {row.get("Tags") for row in processed_data}
+        tag_texts.discard(None)
+        for value in tag_texts:
+            if value:
+                option_mappings["Tags"].update(tag.strip() for tag in str(value).split(",") if tag.strip())
+        return option_mappings
+
+    def prepare_database_for_import(self, database_id: str, processed_data: List[Dict[str, Any]],
+                                    option_values: Optional[Dict[str, set]] = None) -> None:
+        """
+        Datenbank auf Import vorbereiten (Schema + Optionen).
+        
+        Args:
+            option_values: Bereits beim Mapping gesammelte Select-Optionen
+                (z.B. PlannerAPIMapper.option_values) - spart den Durchlauf über alle Zeilen
+        """
+        print("[i] Bereite Datenbank vor...")
+
+        # 1. Notion-Benutzer vorab laden, falls Zuweisungen per E-Mail gemappt werden
+        if self._notion_users_cache is None and any(row.get("Zugewiesen an (Emails)") for row in processed_data):
+            self.load_users()
+
+        # 2. Select-Optionen sammeln (falls nicht schon beim Mapping geschehen)
+        if option_values is not None:
+            option_mappings = {prop_name: set(option_values.get(prop_name, ()))
+                               for prop_name in (*self._SCALAR_OPTION_PROPS, "Tags")}
+        else:
+            option_mappings = self._collect_option_values(processed_data)
+
+        # 3. Schema-Cache: alle Properties und Optionen schon im letzten Lauf angelegt?
+        cached = self._load_schema_cache(database_id)
+        if cached and all(prop_name in cached for prop_name in self.BASE_PROPERTIES) and all(
+            options.issubset(cached[prop_name]) for prop_name, options in option_mappings.items()
+        ):
+            print("[i] Datenbank-Schema unverändert (Cache) - keine Schema-Updates nötig")
+            return
+
+        # 4. Fehlende Properties und neue Optionen in EINEM Update senden
+        try:
+            db = self.get_database(database_id)
+        except Exception as e:
+            print(f"[Warning] Schema-Prüfung fehlgeschlagen: {e}")
+            return
+
+        patch = self._missing_properties(db)
+        messages = [f"[i] {len(patch)} Properties zur Datenbank hinzugefügt"] if patch else []
+
         for prop_name, options in option_mappings.items():
             if options:
-                option_list = sorted(list(options))
-                self.add_select_options_if_needed(database_id, prop_name, option_list)
+                option_patch, added = self._select_options_patch(db, prop_name, sorted(options))
+                if option_patch:
+                    patch[prop_name] = option_patch
+                    messages.append(f"[i] {added} neue Optionen für '{prop_name}' hinzugefügt")
+
+        if patch:
+            try:
+                self._update_database(database_id, patch)
+                print("\n".join(messages))
+            except Exception as e:
+                self._verified_dbs.discard(database_id)
+                print(f"[Warning] Schema-/Option-Update fehlgeschlagen: {e}")
+                return
+        self._verified_dbs.add(database_id)
+
+        # Stand für Folgeläufe merken (bisher bekannte + jetzt vorbereitete Optionen)
+        self._save_schema_cache(database_id, {
+            prop_name: sorted(set(cached.get(prop_name, ())) | option_mappings.get(prop_name, set()))
+            for prop_name in self.BASE_PROPERTIES
+        })
 
 
-def create_notion_mapper(notion_client: NotionClient) -> NotionMapper:
+def create_notion_mapper(notion_client: NotionClient,
+                         schema_cache_dir: Optional[str] = None) -> NotionMapper:
     """Factory-Funktion für NotionMapper."""
-    return NotionMapper(notion_client)
+    return NotionMapper(notion_client, schema_cache_dir)
@@ -8,13 +8,33 @@ Dieses Modul behandelt:
 - Notion-Benutzer über API abrufen
 - Mapping zwischen CSV-Namen und Notion-User-IDs erstellen
 """
+import csv
+import re
+import time
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 # Core-Module importieren
 from core.utils import read_csv_file, split_multi_values
 from core.notion_client import NotionClient
 
+# Trenner für kommagetrennte Namen (inkl. umgebender Leerzeichen)
+_NAME_SPLIT_RE = re.compile(r"\s*,\s*")
+
+# Notion-Benutzerliste prozessweit wiederverwenden (z.B. mehrere Pläne in einem Lauf)
+USERS_CACHE_TTL = 600.0
+_USERS_CACHE: Optional[List[Dict[str, Any]]] = None
+_USERS_CACHE_TS = 0.0
+
+
+def _list_users_cached(notion: NotionClient) -> List[Dict[str, Any]]:
+    """Notion-Benutzer abrufen (höchstens alle USERS_CACHE_TTL Sekunden per API)."""
+    global _USERS_CACHE, _USERS_CACHE_TS
+    if _USERS_CACHE is None or time.monotonic() - _USERS_CACHE_TS > USERS_CACHE_TTL:
+        _USERS_CACHE = notion.list_users()
+        _USERS_CACHE_TS = time.monotonic()
+    return _USERS_CACHE
+
 
 class PeopleMapper:
     """Verwaltet Personen-Mapping zwischen CSV und Notion."""
@@ -27,11 +47,20 @@ class PeopleMapper:
         self.name_to_email: Dict[str, str] = {}
         self.email_to_user_id: Dict[str, str] = {}
         self.name_to_user_id: Dict[str, str] = {}
+        # Wie name_to_user_id, aber mit casefold()-Schlüsseln (Groß-/Kleinschreibung egal)
+        self._name_to_uid_cf: Dict[str, str] = {}
+        # Ergebnis pro Namens-Text (gleiche Zuweisungen wiederholen sich über viele Tasks)
+        self._names_text_cache: Dict[str, Tuple[str, ...]] = {}
 
     def initialize_notion_client(self, notion_client: NotionClient):
         """Notion-Client setzen."""
         self.notion = notion_client
 
+    @staticmethod
+    def preload_users(notion_client: NotionClient) -> None:
+        """Notion-Benutzer einmalig vorab laden (für Migrationen mehrerer Pläne)."""
+        _list_users_cached(notion_client)
+
     def load_mapping_csv(self) -> None:
         """Mapping-CSV laden und Name-zu-Email-Mapping erstellen."""
         if not self.mapping_csv_path or not self.mapping_csv_path.exists():
@@ -52,8 +81,8 @@ class PeopleMapper:
             raise RuntimeError("Notion-Client nicht initialisiert")
 
         try:
-            # Notion-Benutzer abrufen
-            users = self.notion.list_users()
+            # Notion-Benutzer abrufen (prozessweit gecacht)
+            users = _list_users_cached(self.notion)
             
             for user in users:
                 user_id = user.get("id")
@@ -84,29 +113,28 @@ class PeopleMapper:
         self.fetch_notion_users()
 
         # 3. Name-zu-User-ID-Mapping erstellen (case-insensitive E-Mail-Matching)
+        self._names_text_cache.clear()
         for name, email in self.name_to_email.items():
             email_lower = email.lower()
             if email_lower in self.email_to_user_id:
                 self.name_to_user_id[name] = self.email_to_user_id[email_lower]
+        self._name_to_uid_cf = {name.casefold(): uid for name, uid in self.name_to_user_id.items()}
 
     def get_user_id(self, name: str) -> Optional[str]:
-        """User-ID für einen Namen abrufen."""
-        return self.name_to_user_id.get(name)
+        """User-ID für einen Namen abrufen (Groß-/Kleinschreibung egal)."""
+        return self._name_to_uid_cf.get(name.casefold())
 
-    def get_user_ids_for_names(self, names_text: str) -> List[str]:
-        """User-IDs für kommagetrennte Namen abrufen."""
+    def get_user_ids_for_names(self, names_text: str) -> Tuple[str, ...]:
+        """User-IDs für kommagetrennte Namen abrufen (unveränderlich, da gecacht)."""
         if not names_text:
-            return []
+            return ()
 
-        names = [name.strip() for name in names_text.split(",") if name.strip()]
-        user_ids = []
-
-        for name in names:
-            user_id = self.get_user_id(name)
-            if user_id:
-                user_ids.append(user_id)
-
-        return user_ids
+        cached = self._names_text_cache.get(names_text)
+        if cached is None:
+            lookup = self._name_to_uid_cf.get
+            resolved = (lookup(name.casefold()) for name in _NAME_SPLIT_RE.split(names_text.strip()))
+            cached = self._names_text_cache[names_text] = tuple(uid for uid in resolved if uid)
+        return cached
 
     def get_unmapped_names(self) -> List[str]:
         """Namen zurückgeben, die nicht gemappt werden konnten."""
@@ -117,19 +145,18 @@ class PeopleMapper:
 
     def generate_template_csv(self, csv_names: List[str], output_path: Path) -> None:
         """Template-CSV für fehlende Namen generieren."""
-        template_data = []
-
-        for name in csv_names:
-            if name not in self.name_to_email:
-                template_data.append({
-                    "Name_in_CSV": name,
-                    "Notion_Email": ""
-                })
+        known = self.name_to_email
+        template_data = [
+            {"Name_in_CSV": name, "Notion_Email": ""}
+            for name in csv_names
+            if name not in known
+        ]
 
         if template_data:
-            import pandas as pd
-            df = pd.DataFrame(template_data)
-            df.to_csv(output_path, index=False, encoding="utf-8")
+            with open(output_path, "w", encoding="utf-8", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=["Name_in_CSV", "Notion_Email"])
+                writer.writeheader()
+                writer.writerows(template_data)
             print(f"[i] Template-CSV erstellt: {output_path}")
 
 
@@ -5,8 +5,36 @@ Planner-API-zu-Notion Mapper.
 
 Konvertiert Planner-API-JSON-Daten direkt zu Notion-kompatiblem Format.
 """
-from typing import Dict, List, Any, Optional
-from datetime import datetime
+import sys
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Dict, List, Any, Optional, Set
+
+
+# Planner-Priorität (0-10) → Notion-Priorität, Index = Priorität
+_PRIORITY_NAMES = (
+    "Dringend", "Dringend", "Dringend",
+    "Wichtig", "Wichtig",
+    "Mittel",
+    "Niedrig", "Niedrig", "Niedrig", "Niedrig", "Niedrig",
+)
+
+# ISO-8601 parsen; ab Python 3.11 versteht fromisoformat das "Z"-Suffix selbst.
+# Gecacht, da sich Zeitstempel innerhalb eines Plans häufig wiederholen.
+if sys.version_info >= (3, 11):
+    _from_iso = lru_cache(maxsize=1024)(datetime.fromisoformat)
+else:
+    @lru_cache(maxsize=1024)
+    def _from_iso(iso_string: str) -> datetime:
+        return datetime.fromisoformat(iso_string[:-1] + "+00:00" if iso_string.endswith("Z") else iso_string)
+
+# Planner-Datumsfeld → Row-Spalte
+_DATE_FIELDS = (
+    ("startDateTime", "Startdatum"),
+    ("dueDateTime", "Fälligkeitsdatum"),
+    ("completedDateTime", "Abgeschlossen am"),
+    ("createdDateTime", "Erstellt am"),
+)
 
 
 class PlannerAPIMapper:
@@ -16,6 +44,8 @@ class PlannerAPIMapper:
         self.buckets_cache: Dict[str, str] = {}  # bucket_id -> bucket_name
         self.users_cache: Dict[str, Dict[str, str]] = {}  # user_id -> {displayName, mail}
         self.category_descriptions: Dict[str, str] = {}  # category_id -> description
+        # Select-Optionen aller gemappten Tasks (für prepare_database_for_import, ohne zweiten Durchlauf)
+        self.option_values: Dict[str, Set[str]] = {"Bucket": set(), "Status": set(), "Priorität": set(), "Tags": set()}
 
     def set_buckets(self, buckets: List[Dict[str, Any]]) -> None:
         """Buckets zwischenspeichern für späteres Mapping."""
@@ -34,11 +64,15 @@ class PlannerAPIMapper:
         """Category-Descriptions (Tags) zwischenspeichern für späteres Mapping."""
         self.category_descriptions = category_descriptions or {}
 
-    def map_task_to_row(self, task: Dict[str, Any], task_details: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    def map_task_to_row(self, task: Dict[str, Any], task_details: Optional[Dict[str, Any]] = None,
+                        *, now_utc: Optional[datetime] = None) -> Dict[str, Any]:
         """
         Planner-Task zu CSV-ähnlichem Row-Format konvertieren.
         
         Kompatibel mit dem bestehenden notion_mapper.py.
+        
+        Args:
+            now_utc: Referenzzeit (UTC) für "Verspätet" - map_tasks_to_rows setzt sie einmal pro Lauf
         """
         row: Dict[str, Any] = {}
 
@@ -67,32 +101,20 @@ class PlannerAPIMapper:
 
         # ===== Priorität =====
         priority = task.get("priority")
-        priority_map = {
-            0: "Dringend",
-            1: "Dringend",
-            2: "Dringend",
-            3: "Wichtig",
-            4: "Wichtig",
-            5: "Mittel",
-            6: "Niedrig",
-            7: "Niedrig",
-            8: "Niedrig",
-            9: "Niedrig",
-            10: "Niedrig"
-        }
-        row["Priorität"] = priority_map.get(priority, "Mittel")
+        if isinstance(priority, int) and 0 <= priority < len(_PRIORITY_NAMES):
+            row["Priorität"] = _PRIORITY_NAMES[priority]
+        else:
+            row["Priorität"] = "Mittel"
 
         # ===== Zuweisungen =====
         assignments = task.get("assignments", {})
-        assigned_emails = []
-        
-        for user_id in assignments.keys():
-            if user_id in self.users_cache:
-                user_info = self.users_cache[user_id]
-                email = user_info.get("mail")
-                # Nur gültige E-Mails hinzufügen
-                if email:
-                    assigned_emails.append(email)
+        users = self.users_cache
+        # Ein Lookup pro Zuweisung, Reihenfolge bleibt; nur gültige E-Mails übernehmen
+        assigned_emails = [
+            email for email in (
+                user_info.get("mail") for user_info in map(users.get, assignments) if user_info
+            ) if email
+        ]
         
         # Für direktes Notion People-Mapping via E-Mail
         if assigned_emails:
@@ -100,71 +122,38 @@ class PlannerAPIMapper:
 
         # ===== Tags (aus appliedCategories) =====
         applied_categories = task.get("appliedCategories", {})
-        tags = []
-        for category_id in applied_categories.keys():
-            if category_id in self.category_descriptions:
-                tag_name = self.category_descriptions[category_id]
-                if tag_name:  # Nur nicht-leere Tags
-                    tags.append(tag_name)
+        # Ein Lookup pro Category; nur nicht-leere Tags
+        tags = [tag_name for tag_name in map(self.category_descriptions.get, applied_categories) if tag_name]
         
         if tags:
             row["Tags"] = ", ".join(tags)
 
+        # Optionen gleich beim Mapping sammeln
+        option_values = self.option_values
+        option_values["Bucket"].add(row["Bucket"])
+        option_values["Status"].add(row["Status"])
+        option_values["Priorität"].add(row["Priorität"])
+        if tags:
+            # Wie beim Import: Tag-Text an Kommas aufsplitten
+            option_values["Tags"].update(tag.strip() for tag in row["Tags"].split(",") if tag.strip())
+
         # ===== "Verspätet"-Feld (automatisch berechnet) =====
         is_overdue = False
         due_date = task.get("dueDateTime")
         if due_date and percent_complete < 100:
             try:
-                from datetime import timezone
-                due_dt = datetime.fromisoformat(due_date.replace("Z", "+00:00"))
-                now = datetime.now(timezone.utc)
-                if due_dt < now:
+                due_dt = _from_iso(due_date)
+                if due_dt < (now_utc or datetime.now(timezone.utc)):
                     is_overdue = True
-            except:
+            except (ValueError, TypeError, AttributeError):
                 pass  # Bei Fehler: nicht verspätet
         
         row["Verspätet"] = is_overdue
 
-        # ===== Datumsfelder =====
-        # Startdatum
-        start_date = task.get("startDateTime")
-        if start_date:
-            try:
-                row["Startdatum"] = self._parse_iso_date(start_date)
-            except:
-                row["Startdatum"] = None
-        else:
-            row["Startdatum"] = None
-
-        # Fälligkeitsdatum
-        due_date = task.get("dueDateTime")
-        if due_date:
-            try:
-                row["Fälligkeitsdatum"] = self._parse_iso_date(due_date)
-            except:
-                row["Fälligkeitsdatum"] = None
-        else:
-            row["Fälligkeitsdatum"] = None
-
-        # Abschlussdatum
-        completed_date = task.get("completedDateTime")
-        if completed_date:
-            try:
-                row["Abgeschlossen am"] = self._parse_iso_date(completed_date)
-            except:
-                row["Abgeschlossen am"] = None
-        else:
-            row["Abgeschlossen am"] = None
-
-        # Erstellungsdatum
-        created_date = task.get("createdDateTime")
-        if created_date:
-            try:
-                row["Erstellt am"] = self._parse_iso_date(created_date)
-            except:
-                row["Erstellt am"] = None
-        else:
-            row["Erstellt am"] = None
+        # ===== Datumsfelder (Start, Fällig, Abgeschlossen, Erstellt) =====
+        for source_field, column in _DATE_FIELDS:
+            value = task.get(source_field)
+            row[column] = self._parse_iso_date(value) if value else None
 
         # ===== Beschreibung & Checklisten (aus task_details) =====
         if task_details:
@@ -176,21 +165,20 @@ class PlannerAPIMapper:
             # Checklisten - als strukturierte Liste für To-Do-Blöcke
             checklist = task_details.get("checklist", {})
             if checklist:
+                # Strukturierte Liste und Text-Version (Kompatibilität) in einem Durchlauf
                 checklist_items = []
-                for item_id, item in checklist.items():
+                text_items = []
+                for item in checklist.values():
                     title = item.get("title", "")
                     is_checked = item.get("isChecked", False)
                     checklist_items.append({
                         "title": title,
                         "checked": is_checked
                     })
-                
-                if checklist_items:
-                    # Sortiere nach orderHint falls vorhanden
-                    row["Checkliste_structured"] = checklist_items
-                    # Behalte auch Text-Version für Kompatibilität
-                    text_items = [f"{'✅' if item['checked'] else '☐'} {item['title']}" for item in checklist_items]
-                    row["Checkliste"] = "\n".join(text_items)
+                    text_items.append(f"{'✅' if is_checked else '☐'} {title}")
+
+                row["Checkliste_structured"] = checklist_items
+                row["Checkliste"] = "\n".join(text_items)
 
             # Referenzen/Anhänge
             references = task_details.get("references", {})
@@ -217,10 +205,14 @@ class PlannerAPIMapper:
         """ISO-8601-Datum zu Notion-kompatiblem Format (YYYY-MM-DD) konvertieren."""
         # Planner verwendet ISO-8601 Format: 2024-01-15T00:00:00Z
         # Notion erwartet: YYYY-MM-DD
+        # Schnellpfad: Datumsteil direkt abschneiden, ohne datetime-Objekt
+        if (len(iso_string) == 10 or iso_string[10:11] == "T") and iso_string[4:5] == "-" \
+                and iso_string[7:8] == "-" and iso_string[:4].isdigit() \
+                and iso_string[5:7].isdigit() and iso_string[8:10].isdigit():
+            return iso_string[:10]
         try:
-            dt = datetime.fromisoformat(iso_string.replace("Z", "+00:00"))
-            return dt.strftime("%Y-%m-%d")
-        except:
+            return _from_iso(iso_string).strftime("%Y-%m-%d")
+        except ValueError:
             # Fallback: Nur Datumsteil extrahieren (ohne Zeit)
             return iso_string.split("T")[0] if "T" in iso_string else iso_string
 
@@ -239,19 +231,11 @@ class PlannerAPIMapper:
         Returns:
             Liste von Row-Dicts (kompatibel mit notion_mapper)
         """
-        rows = []
-        
-        for task in tasks:
-            task_id = task.get("id")
-            details = None
-            
-            if tasks_details and task_id in tasks_details:
-                details = tasks_details[task_id]
-            
-            row = self.map_task_to_row(task, details)
-            rows.append(row)
-        
-        return rows
+        map_task = self.map_task_to_row
+        now_utc = datetime.now(timezone.utc)
+        if not tasks_details:
+            return [map_task(task, None, now_utc=now_utc) for task in tasks]
+        return [map_task(task, tasks_details.get(task.get("id")), now_utc=now_utc) for task in tasks]
 
 
 def create_planner_api_mapper() -> PlannerAPIMapper:
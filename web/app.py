@@ -2,8 +2,15 @@
 Flask Web-GUI für Microsoft-Notion Migration Tools.
 """
 import os
+import re
 import secrets
-from flask import Flask, render_template, session, redirect, url_for, request, jsonify
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from pathlib import Path
+from flask import Flask, Response, render_template, session, redirect, url_for, request, jsonify
+from flask.json.provider import JSONProvider
 from dotenv import load_dotenv
 
 # Lade .env-Datei
@@ -13,35 +20,216 @@ load_dotenv()
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from core.auth import AuthManager, AuthConfig
+from core.ms_graph_client import MSGraphClient
+from core.notion_client import NotionClient
+from core.utils import LRUCache, create_http_session, json_dumps, json_loads
+from tools.planner_migration.planner_api_mapper import create_planner_api_mapper
+from tools.planner_migration.notion_mapper import create_notion_mapper
+from tools.planner_migration import DETAIL_WORKERS, PAGE_WORKERS
+
+
+class FastJSONProvider(JSONProvider):
+    """JSON-Provider auf Basis von core.utils (orjson, Fallback: json) - gilt für jsonify."""
+
+    def dumps(self, obj, **kwargs) -> str:
+        return json_dumps(obj).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        return json_loads(s)
+
+    def response(self, *args, **kwargs):
+        # Bytes direkt in die Response, ohne Umweg über str
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(json_dumps(obj), mimetype="application/json")
+
 
 # Flask-App initialisieren
-app = Flask(__name__)
-app.secret_key = os.getenv("FLASK_SECRET_KEY", secrets.token_hex(32))
+# Ohne FLASK_SECRET_KEY: erzeugten Schlüssel hier ablegen, damit ein Neustart
+# nicht alle Sessions ungültig macht
+SECRET_KEY_FILE = "~/.cache/move2notion/flask_secret_key"
 
-# Globaler Auth-Manager für Web
-web_auth_manager = AuthManager()
 
+def load_secret_key() -> str:
+    """FLASK_SECRET_KEY aus der Umgebung, sonst aus SECRET_KEY_FILE (bei Bedarf neu erzeugt)."""
+    key = os.getenv("FLASK_SECRET_KEY")
+    if key:
+        return key
 
-def init_auth():
-    """Authentifizierung initialisieren."""
-    if not web_auth_manager.mode:
-        web_auth_manager.initialize(mode="web")
+    path = Path(SECRET_KEY_FILE).expanduser()
+    try:
+        key = path.read_text(encoding="utf-8").strip()
+        if key:
+            return key
+    except OSError:
+        pass
 
+    key = secrets.token_hex(32)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.touch(mode=0o600)
+        path.write_text(key, encoding="utf-8")
+        print(f"[⚠] FLASK_SECRET_KEY nicht gesetzt - Schlüssel erzeugt und in {path} gespeichert")
+    except OSError as e:
+        print(f"[⚠] FLASK_SECRET_KEY nicht gesetzt - Sessions gelten nur bis zum Neustart ({e})")
+    return key
+
+
+app = Flask(__name__)
+app.json = FastJSONProvider(app)
+app.secret_key = load_secret_key()
+# style.css/main.js dürfen Browser bzw. Reverse Proxy eine Stunde zwischenspeichern
+app.config["SEND_FILE_MAX_AGE_DEFAULT"] = int(os.getenv("STATIC_MAX_AGE", 3600))
 
-@app.before_request
-def before_request():
-    """Vor jedem Request: Auth initialisieren."""
-    init_auth()
+# Globaler Auth-Manager für Web - erst beim ersten Bedarf initialisieren (ensure_auth):
+# die Tenant-Discovery von msal braucht Netz, App und gunicorn starten auch offline
+web_auth_manager = AuthManager()
+auth_ready = False
+auth_init_lock = threading.Lock()
+
+
+def ensure_auth() -> AuthManager:
+    """web_auth_manager einmalig initialisieren (thread-sicher, ohne Lock sobald bereit)."""
+    global auth_ready
+    if not auth_ready:
+        with auth_init_lock:
+            if not auth_ready:
+                web_auth_manager.initialize(mode="web")
+                auth_ready = True
+    return web_auth_manager
+
+# HTTP-Sessions einmal pro Prozess: sie halten Keep-Alive-Verbindungen zu
+# graph.microsoft.com bzw. api.notion.com über alle Requests und Jobs hinweg
+graph_session = create_http_session()
+notion_client = NotionClient(web_auth_manager)
+
+# Graph-Token gelten ca. eine Stunde - pro Client höchstens alle GRAPH_HEADERS_TTL
+# Sekunden erneuern statt vor jedem Graph-Request
+GRAPH_HEADERS_TTL = 300.0
+
+
+class SessionGraphAuth:
+    """Auth-Adapter für MSGraphClient: Graph-Header aus dem Token einer Web-Session."""
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self._headers = None
+        self._fetched_at = 0.0
+
+    @property
+    def microsoft(self):
+        return self
+
+    @property
+    def headers(self) -> dict:
+        if self._headers is None or time.monotonic() - self._fetched_at >= GRAPH_HEADERS_TTL:
+            self._headers = ensure_auth().microsoft.get_headers(self.session_id)
+            self._fetched_at = time.monotonic()
+        return self._headers
+
+
+def create_graph_client(session_id: str) -> MSGraphClient:
+    """Graph-Client für eine Web-Session (Token der Session, gemeinsame HTTP-Session)."""
+    return MSGraphClient(SessionGraphAuth(session_id), session=graph_session)
+
+# Hintergrund-Jobs für lange Migrationen (Request kehrt sofort mit Job-ID zurück).
+# Bewusst im selben Prozess: die Microsoft-Tokens liegen im Speicher von web_auth_manager.
+MIGRATION_WORKERS = int(os.getenv("MIGRATION_WORKERS", 2))
+job_executor = ThreadPoolExecutor(max_workers=MIGRATION_WORKERS, thread_name_prefix="migration")
+# job_id -> {"state", "info"}; verdrängt werden nur abgeschlossene Jobs (älteste zuerst)
+MAX_JOBS = 200
+jobs = {}
+# Schützt jobs und weckt wartende SSE-Streams, sobald sich ein Job ändert
+jobs_changed = threading.Condition()
+
+# Abgeschlossene Job-Zustände; Keep-Alive-Kommentar für offene Streams (Sekunden)
+JOB_FINAL_STATES = ("SUCCESS", "FAILURE")
+JOB_STREAM_KEEPALIVE = 15.0
+
+# Eingaben vor dem ersten API-Aufruf prüfen (Planner-IDs: 28 Zeichen Base64url,
+# Notion-IDs: UUID mit/ohne Bindestriche, Sites: HTTPS-URL)
+_PLAN_ID_RE = re.compile(r"[A-Za-z0-9_-]{20,40}")
+_DATABASE_ID_RE = re.compile(r"[0-9a-fA-F]{8}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{12}")
+_SITE_URL_RE = re.compile(r"https://[^/\s]+(/\S*)?")
+
+# Max. Anzahl Fehler im Job-Ergebnis (alle weiteren nur im Log)
+MAX_REPORTED_ERRORS = 10
+
+# Gruppenmitglieder ändern sich selten - bei erneuter Migration nicht neu laden
+MEMBERS_CACHE_TTL = 300.0
+members_cache = LRUCache(maxsize=256)  # (session_id, group_id) -> (Zeitstempel, Mitglieder)
+
+
+def create_job(job_id: str) -> dict:
+    """Job anlegen; bei mehr als MAX_JOBS die ältesten abgeschlossenen Jobs verwerfen."""
+    job = {"state": "PENDING", "info": {}}
+    with jobs_changed:
+        jobs[job_id] = job
+        excess = len(jobs) - MAX_JOBS
+        if excess > 0:
+            finished = [jid for jid, j in jobs.items() if j["state"] in JOB_FINAL_STATES]
+            for jid in finished[:excess]:
+                del jobs[jid]
+    return job
+
+
+def update_job(job: dict, state: str = None, info: dict = None) -> None:
+    """Job-Status/-Fortschritt setzen und wartende Streams benachrichtigen."""
+    with jobs_changed:
+        if state is not None:
+            job["state"] = state
+        if info is not None:
+            job["info"] = info
+        jobs_changed.notify_all()
+
+
+def get_group_members_cached(ms_client: MSGraphClient, group_id: str) -> list:
+    """Gruppenmitglieder abrufen (pro Session höchstens alle MEMBERS_CACHE_TTL Sekunden per API)."""
+    key = (ms_client.auth.session_id, group_id)
+    cached = members_cache.get(key)
+    if cached and time.monotonic() - cached[0] < MEMBERS_CACHE_TTL:
+        return cached[1]
+    members = ms_client.get_group_members(group_id)
+    members_cache[key] = (time.monotonic(), members)
+    return members
+
+
+# Gerenderte Dashboards: ohne dynamische Daten und nur für angemeldete Nutzer -
+# pro Template und Script-Root einmal rendern (im Debug-Modus immer neu)
+rendered_pages = {}  # (template, script_root) -> HTML
+
+
+def render_static_page(template: str) -> str:
+    """Template ohne Kontextvariablen rendern und das Ergebnis zwischenspeichern."""
+    key = (template, request.script_root)
+    html = rendered_pages.get(key)
+    if html is None:
+        html = render_template(template)
+        if not app.debug:
+            rendered_pages[key] = html
+    return html
+
+
+def login_required(api: bool = False):
+    """Route nur für angemeldete Nutzer; sonst Login-Redirect bzw. 401 (api=True)."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if "authenticated" not in session:
+                if api:
+                    return jsonify({"error": "Not authenticated"}), 401
+                return redirect(url_for("login"))
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
 
 
 # ===== Authentifizierungs-Routes =====
 
 @app.route("/")
+@login_required()
 def index():
     """Hauptseite / Dashboard."""
-    if "authenticated" not in session:
-        return redirect(url_for("login"))
-    return render_template("dashboard.html")
+    return render_static_page("dashboard.html")
 
 
 @app.route("/login")
@@ -55,7 +243,11 @@ def login():
         session["session_id"] = secrets.token_urlsafe(32)
     
     # Generiere Auth-URL
-    auth_url = web_auth_manager.microsoft.get_auth_url(session["session_id"])
+    try:
+        auth_url = ensure_auth().microsoft.get_auth_url(session["session_id"])
+    except Exception as e:
+        print(f"[❌] Web-Authentifizierung konnte nicht initialisiert werden: {e}")
+        return render_template("error.html", error=f"Authentication not available: {str(e)}"), 503
     
     return render_template("login.html", auth_url=auth_url)
 
@@ -79,7 +271,7 @@ def callback():
     
     try:
         # Token erwerben
-        web_auth_manager.microsoft.acquire_token_by_auth_code(code, session_id)
+        ensure_auth().microsoft.acquire_token_by_auth_code(code, session_id)
         session["authenticated"] = True
         return redirect(url_for("index"))
     except Exception as e:
@@ -90,7 +282,8 @@ def callback():
 def logout():
     """Logout."""
     session_id = session.get("session_id")
-    if session_id:
+    # Ohne initialisierte Auth gibt es auch keine Tokens zu löschen
+    if session_id and auth_ready:
         web_auth_manager.microsoft.clear_session(session_id)
     session.clear()
     return redirect(url_for("login"))
@@ -99,35 +292,30 @@ def logout():
 # ===== OneNote-Migration Routes =====
 
 @app.route("/onenote")
+@login_required()
 def onenote_dashboard():
     """OneNote-Migration Dashboard."""
-    if "authenticated" not in session:
-        return redirect(url_for("login"))
-    return render_template("onenote_dashboard.html")
+    return render_static_page("onenote_dashboard.html")
 
 
 @app.route("/api/onenote/notebooks", methods=["GET"])
+@login_required(api=True)
 def get_notebooks():
     """Liste aller OneNote-Notebooks abrufen."""
-    if "authenticated" not in session:
-        return jsonify({"error": "Not authenticated"}), 401
-    
     try:
-        from core.ms_graph_client import MSGraphClient
-        
         # Site-URL aus Request-Parameter
         site_url = request.args.get("site_url")
         if not site_url:
             return jsonify({"error": "site_url parameter required"}), 400
-        
-        # MS Graph Client erstellen
-        client = MSGraphClient(web_auth_manager)
+        if not _SITE_URL_RE.fullmatch(site_url):
+            return jsonify({"error": "invalid site_url"}), 400
         
         # Site-ID auflösen
-        site_id = client.resolve_site_id_from_url(site_url)
+        graph_client = create_graph_client(session.get("session_id"))
+        site_id = graph_client.resolve_site_id_from_url(site_url)
         
         # Notebooks abrufen
-        notebooks = client.list_site_notebooks(site_id)
+        notebooks = graph_client.list_site_notebooks(site_id)
         
         return jsonify({
             "site_id": site_id,
@@ -138,13 +326,11 @@ def get_notebooks():
 
 
 @app.route("/api/onenote/migrate", methods=["POST"])
+@login_required(api=True)
 def start_onenote_migration():
     """OneNote-Migration starten."""
-    if "authenticated" not in session:
-        return jsonify({"error": "Not authenticated"}), 401
-    
     # TODO: Implementierung der Migration in Background-Thread
-    data = request.json
+    data = request.get_json(silent=True)
     return jsonify({
         "status": "started",
         "message": "Migration wird gestartet...",
@@ -155,27 +341,19 @@ def start_onenote_migration():
 # ===== Planner-Migration Routes =====
 
 @app.route("/planner")
+@login_required()
 def planner_dashboard():
     """Planner-Migration Dashboard."""
-    if "authenticated" not in session:
-        return redirect(url_for("login"))
-    return render_template("planner_dashboard.html")
+    return render_static_page("planner_dashboard.html")
 
 
 @app.route("/api/planner/migrate", methods=["POST"])
+@login_required(api=True)
 def start_planner_migration():
     """Planner-Migration starten."""
-    if "authenticated" not in session:
-        return jsonify({"error": "Not authenticated"}), 401
-    
     try:
-        from core.ms_graph_client import MSGraphClient
-        from core.notion_client import NotionClient
-        from tools.planner_migration.planner_api_mapper import create_planner_api_mapper
-        from tools.planner_migration.notion_mapper import create_notion_mapper
-        
-        # Request-Daten abrufen
-        data = request.json
+        # Request-Daten einmal parsen (app.json: orjson); kein/ungültiges JSON -> {}
+        data = request.get_json(silent=True) or {}
         plan_id = data.get("plan_id")
         database_id = data.get("database_id")
         
@@ -183,48 +361,77 @@ def start_planner_migration():
             return jsonify({"error": "plan_id required"}), 400
         if not database_id:
             return jsonify({"error": "database_id required"}), 400
+        if not isinstance(plan_id, str) or not _PLAN_ID_RE.fullmatch(plan_id.strip()):
+            return jsonify({"error": "invalid plan_id"}), 400
+        if not isinstance(database_id, str) or not _DATABASE_ID_RE.fullmatch(database_id.strip()):
+            return jsonify({"error": "invalid database_id"}), 400
+        plan_id = plan_id.strip()
+        database_id = database_id.strip()
+        skip_existing = bool(data.get("skip_existing", False))
         
-        # MS Graph Client erstellen
-        ms_client = MSGraphClient(web_auth_manager)
-        
-        # 1. Plan-Details abrufen
-        plan = ms_client.get_planner_plan(plan_id)
+        # Job anlegen und Migration im Hintergrund ausführen
+        job_id = secrets.token_urlsafe(16)
+        job = create_job(job_id)
+        job_executor.submit(run_planner_migration, job_id, job, plan_id, database_id,
+                            session.get("session_id"), skip_existing)
+
+        return jsonify({
+            "status": "started",
+            "message": "Migration wird gestartet...",
+            "job_id": job_id
+        }), 202
+
+    except Exception as e:
+        return jsonify({
+            "status": "error",
+            "message": f"Migration fehlgeschlagen: {str(e)}"
+        }), 500
+
+
+def run_planner_migration(job_id: str, job: dict, plan_id: str, database_id: str, session_id: str,
+                          skip_existing: bool = False) -> None:
+    """Planner-Migration ausführen (im Hintergrund-Thread, Status im übergebenen Job-Dict)."""
+    update_job(job, state="RUNNING")
+
+    try:
+        ensure_auth()
+        ms_client = create_graph_client(session_id)
+
+        # 1.-3. Plan, Plan-Details (Category-Descriptions), Buckets und Tasks
+        # mit einem $batch-Request abrufen
+        bundle = ms_client.get_planner_plan_bundle(plan_id)
+        plan = bundle["plan"]
         plan_title = plan.get("title", "Unbekannter Plan")
         group_id = plan.get("owner")  # Group ID für Mitglieder-Abruf
+        category_descriptions = bundle["details"].get("categoryDescriptions", {})
+        buckets = bundle["buckets"]
+        tasks = bundle["tasks"]
         
-        # 1b. Plan-Details für Category-Descriptions abrufen
-        try:
-            plan_details = ms_client.get_planner_plan_details(plan_id)
-            category_descriptions = plan_details.get("categoryDescriptions", {})
-        except Exception:
-            category_descriptions = {}
-        
-        # 2. Buckets abrufen
-        buckets = ms_client.list_planner_buckets(plan_id)
-        
-        # 3. Tasks abrufen
-        tasks = ms_client.list_planner_tasks(plan_id)
-        
-        # 4. Task-Details abrufen (Beschreibung, Checklisten)
+        # 4./5. Task-Details (je BATCH_LIMIT Tasks pro $batch-Request) und
+        # Gruppenmitglieder parallel abrufen
         tasks_details = {}
-        for task in tasks:
-            task_id = task.get("id")
-            if task_id:
+        group_members = []
+        task_ids = [task["id"] for task in tasks if task.get("id")]
+        limit = ms_client.BATCH_LIMIT
+        with ThreadPoolExecutor(max_workers=DETAIL_WORKERS) as pool:
+            members_future = pool.submit(get_group_members_cached, ms_client, group_id) if group_id else None
+            futures = [
+                pool.submit(ms_client.get_task_details_batch, task_ids[i:i + limit])
+                for i in range(0, len(task_ids), limit)
+            ]
+            for future in futures:
                 try:
-                    details = ms_client.get_task_details(task_id)
-                    tasks_details[task_id] = details
-                except Exception as e:
+                    tasks_details.update(future.result())
+                except Exception:
                     # Task-Details optional - bei Fehler einfach überspringen
                     pass
-        
-        # 5. Gruppenmitglieder abrufen (für Personen-Zuordnung)
-        group_members = []
-        if group_id:
-            try:
-                group_members = ms_client.get_group_members(group_id)
-            except Exception as e:
-                # Gruppenmitglieder optional
-                pass
+
+            if members_future:
+                try:
+                    group_members = members_future.result()
+                except Exception:
+                    # Gruppenmitglieder optional
+                    pass
         
         # 6. API-Mapper erstellen und Daten konvertieren
         api_mapper = create_planner_api_mapper()
@@ -238,56 +445,119 @@ def start_planner_migration():
         rows = api_mapper.map_tasks_to_rows(tasks, tasks_details)
         
         if not rows:
-            return jsonify({
-                "status": "error",
-                "message": "Keine Tasks im Plan gefunden"
-            }), 400
+            update_job(job, "FAILURE", {"status": "error", "message": "Keine Tasks im Plan gefunden"})
+            return
         
-        # 7. Notion-Client und Mapper erstellen
-        notion_client = NotionClient()
+        # 7. Notion-Mapper erstellen
         notion_mapper = create_notion_mapper(notion_client)
         
         # 8. Datenbank vorbereiten (Properties und Optionen)
-        notion_mapper.prepare_database_for_import(database_id, rows)
+        notion_mapper.prepare_database_for_import(database_id, rows, api_mapper.option_values)
         
-        # 9. Daten in Notion importieren
+        # 9. Auf Wunsch doppelte und bereits vorhandene Tasks überspringen
+        skipped_count = 0
+        if skip_existing:
+            rows, skipped_count = notion_mapper.filter_new_rows(database_id, rows)
+        
+        # 10. Daten in Notion importieren
+        total = len(rows)
+        update_job(job, info={"done": 0, "total": total})
         success_count = 0
         error_count = 0
         errors = []
         
-        for row in rows:
-            try:
-                # Properties und Blöcke erstellen
-                properties = notion_mapper.build_properties_for_row(row, None)
-                children = notion_mapper.build_children_blocks(row)
-                
-                # Seite erstellen
-                notion_client.create_page(database_id, properties, children)
-                success_count += 1
-                
-            except Exception as e:
-                error_count += 1
-                errors.append({
-                    "task": row.get("Name", "Unbekannt"),
-                    "error": str(e)
-                })
+        with ThreadPoolExecutor(max_workers=PAGE_WORKERS) as pool:
+            # Properties und Blöcke sequentiell erstellen, Seiten parallel anlegen
+            # (das Notion-Rate-Limit gilt global über alle Threads)
+            pages = []
+            for row in rows:
+                try:
+                    properties = notion_mapper.build_properties_for_row(row, None)
+                    children = notion_mapper.build_children_blocks(row)
+                    pages.append((row, pool.submit(notion_client.create_page, database_id, properties, children)))
+                except Exception as e:
+                    pages.append((row, e))
+
+            # Ergebnisse in Reihenfolge einsammeln - Zähler nur in diesem Thread
+            for row, page in pages:
+                try:
+                    if isinstance(page, Exception):
+                        raise page
+                    page.result()
+                    success_count += 1
+
+                except Exception as e:
+                    error_count += 1
+                    # Alle Fehler ins Log, im Job-Ergebnis nur die ersten MAX_REPORTED_ERRORS
+                    print(f"[❌] Job {job_id}: '{row.get('Name', 'Unbekannt')}' fehlgeschlagen: {e}")
+                    if len(errors) < MAX_REPORTED_ERRORS:
+                        errors.append({
+                            "task": row.get("Name", "Unbekannt"),
+                            "error": str(e)
+                        })
+
+                update_job(job, info={"done": success_count + error_count, "total": total})
         
-        # 10. Ergebnis zurückgeben
-        return jsonify({
+        # 11. Ergebnis im Job ablegen
+        update_job(job, "SUCCESS", {
             "status": "completed",
-            "message": f"Migration abgeschlossen: {success_count} erfolgreich, {error_count} Fehler",
+            "message": f"Migration abgeschlossen: {success_count} erfolgreich, {error_count} Fehler, {skipped_count} übersprungen",
             "plan_title": plan_title,
-            "total_tasks": len(rows),
+            "total_tasks": len(rows) + skipped_count,
             "success_count": success_count,
             "error_count": error_count,
-            "errors": errors[:10] if errors else []  # Max. 10 Fehler anzeigen
+            "skipped_count": skipped_count,
+            "errors": errors
         })
         
     except Exception as e:
-        return jsonify({
+        update_job(job, "FAILURE", {
             "status": "error",
             "message": f"Migration fehlgeschlagen: {str(e)}"
-        }), 500
+        })
+
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+@login_required(api=True)
+def get_job_status(job_id):
+    """Status eines Hintergrund-Jobs abrufen (PENDING/RUNNING/SUCCESS/FAILURE)."""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+
+    return jsonify({
+        "job_id": job_id,
+        "state": job["state"],
+        "info": job["info"]
+    })
+
+
+@app.route("/api/jobs/<job_id>/stream", methods=["GET"])
+@login_required(api=True)
+def stream_job_status(job_id):
+    """Job-Status als Server-Sent Events (ein Event pro Änderung, Ende bei SUCCESS/FAILURE)."""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+
+    def generate():
+        last = None
+        while True:
+            with jobs_changed:
+                state, info = job["state"], job["info"]
+                if (state, info) == last:
+                    jobs_changed.wait(JOB_STREAM_KEEPALIVE)
+                    state, info = job["state"], job["info"]
+            if (state, info) == last:
+                yield b": keep-alive\n\n"
+                continue
+            last = (state, info)
+            yield b"data: " + json_dumps({"job_id": job_id, "state": state, "info": info}) + b"\n\n"
+            if state in JOB_FINAL_STATES:
+                return
+
+    return Response(generate(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 
 # ===== Fehlerbehandlung =====
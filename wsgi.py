@@ -0,0 +1,6 @@
+"""
+WSGI-Einstiegspunkt für die Web-GUI (Produktionsbetrieb, z.B. mit gunicorn).
+
+    gunicorn wsgi:application -k gthread -w 1 --threads 32 -b 0.0.0.0:8080
+"""
+from web.app import app as application